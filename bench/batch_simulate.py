@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from card import CardCatalog, CardType, CardCategory
+from game import Game, SCORE_CATEGORIES, SCORE_INDEX
+from simulate import load_catalog
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# many games at once as arrays, every unfinished game takes one action per step through the same rules as events/play,
+# a draw picks uniformly from the cards left in the deck, the same distribution as taking the top of the shuffled stack
+
+TURN = 0
+COUNTER = 1
+END = 2
+
+HAND_SIZE = 5
+
+
+class Strategy(NamedTuple):
+    # chances to attack, defend and counter when the player holds a card for it, anything else is a skip
+    attack_rate: float
+    defend_rate: float
+    counter_rate: float
+
+
+def parse_strategy(text: str) -> Strategy:
+    attack_rate, defend_rate, counter_rate = [float(value) for value in text.split(",")]
+    if attack_rate + defend_rate > 1.0:
+        raise ValueError(f"Attack and defend rates of {text} add up to more than 1")
+    return Strategy(attack_rate, defend_rate, counter_rate)
+
+
+class CardTable:
+    # the catalog as arrays indexed by position, cards are in the order of their ids
+    def __init__(self, catalog: CardCatalog) -> None:
+        self.cards = sorted(catalog.cards.values(), key=lambda card: card.id)
+        positions = {card.id: position for position, card in enumerate(self.cards)}
+        for card in self.cards:
+            if card.card_type is CardType.ATTACK and card.card_category not in SCORE_INDEX:
+                raise ValueError(f"Attack card {card} has no scored category")
+
+        self.deck_counts = np.bincount([positions[card_id] for card_id in catalog.deck_card_ids], minlength=len(self.cards)).astype(np.int16)
+        self.deck_size = int(self.deck_counts.sum())
+        self.is_attack = np.array([card.card_type is CardType.ATTACK for card in self.cards], dtype=np.int16)
+        # wild cards only counter, they are never played as a defend
+        self.is_scoring_defend = np.array([
+            card.card_type is CardType.DEFEND and card.card_category is not CardCategory.WILD for card in self.cards
+        ], dtype=np.int16)
+        self.category = np.array([SCORE_INDEX.get(card.card_category, -1) for card in self.cards], dtype=np.int8)
+        # defend cards that may answer each attack card, the checks of counter_action
+        self.counters = np.array([[
+            defend_card.card_type is CardType.DEFEND
+            and defend_card.card_category in (CardCategory.WILD, attack_card.card_category)
+            and bool(set(defend_card.card_sub_categories) & set(attack_card.card_sub_categories))
+            for defend_card in self.cards
+        ] for attack_card in self.cards], dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+
+class CardStats:
+    def __init__(self, card_count: int) -> None:
+        self.attacks = np.zeros(card_count, dtype=np.int64)
+        self.defends = np.zeros(card_count, dtype=np.int64)
+        self.counters = np.zeros(card_count, dtype=np.int64)
+        # attacks that went unanswered and scored, attacks that were countered
+        self.attacks_scored = np.zeros(card_count, dtype=np.int64)
+        self.attacks_countered = np.zeros(card_count, dtype=np.int64)
+        # finished games in which a player played the card at least once, and how many of those the player won
+        self.played_games = np.zeros(card_count, dtype=np.int64)
+        self.won_games = np.zeros(card_count, dtype=np.int64)
+
+    def count(self, counts, card_positions) -> None:
+        counts += np.bincount(card_positions, minlength=len(counts))
+
+
+class BatchSimulation:
+    # two players per game, the first player of every game plays the first strategy
+    def __init__(self, table: CardTable, strategies: List[Strategy], game_count: int, rng, stats: CardStats) -> None:
+        self.table = table
+        self.rng = rng
+        self.stats = stats
+        self.attack_rates = np.array([strategy.attack_rate for strategy in strategies])
+        self.defend_rates = np.array([strategy.attack_rate + strategy.defend_rate for strategy in strategies])
+        self.counter_rates = np.array([strategy.counter_rate for strategy in strategies])
+
+        card_count = len(table)
+        self.hands = np.zeros((game_count, Game.PLAYER_LIMIT, card_count), dtype=np.int16)
+        self.deck = np.tile(table.deck_counts, (game_count, 1))
+        self.deck_sizes = np.full(game_count, table.deck_size, dtype=np.int32)
+        self.discard = np.zeros((game_count, card_count), dtype=np.int16)
+        self.discard_sizes = np.zeros(game_count, dtype=np.int32)
+        self.scores = np.zeros((game_count, Game.PLAYER_LIMIT, len(SCORE_CATEGORIES)), dtype=np.int16)
+        self.states = np.full(game_count, TURN, dtype=np.int8)
+        self.turns = np.zeros(game_count, dtype=np.int8)
+        self.discarded = np.full(game_count, -1, dtype=np.int16)
+        self.actions = np.zeros(game_count, dtype=np.int32)
+        self.winners = np.full(game_count, -1, dtype=np.int8)
+        self.played = np.zeros((game_count, Game.PLAYER_LIMIT, card_count), dtype=bool)
+
+    def pick(self, weights, totals):
+        # position of a card picked with the given weight per card, every row has a total above zero
+        thresholds = self.rng.integers(0, totals).astype(np.int16)
+        return (weights.cumsum(axis=1, dtype=np.int16) > thresholds[:, None]).argmax(axis=1)
+
+    def draw(self, games, players) -> None:
+        empty = self.deck_sizes[games] == 0
+        if empty.any():
+            self.reshuffle(games[empty])
+        cards = self.pick(self.deck[games], self.deck_sizes[games])
+        self.deck[games, cards] -= 1
+        self.deck_sizes[games] -= 1
+        self.hands[games, players, cards] += 1
+
+    def reshuffle(self, games) -> None:
+        # the discard pile becomes the deck, a fresh set of cards is opened when nothing was discarded yet
+        has_discard = self.discard_sizes[games] > 0
+        self.deck[games] = np.where(has_discard[:, None], self.discard[games], self.table.deck_counts)
+        self.deck_sizes[games] = np.where(has_discard, self.discard_sizes[games], self.table.deck_size)
+        self.discard[games] = 0
+        self.discard_sizes[games] = 0
+
+    def play(self, games, players, cards) -> None:
+        self.hands[games, players, cards] -= 1
+        self.discard[games, cards] += 1
+        self.discard_sizes[games] += 1
+        self.discarded[games] = cards
+        self.played[games, players, cards] = True
+
+    def end_won(self, games):
+        # games that were won are ended, the rest go back to turn mode, returns which games go on
+        has_won = self.scores[games].min(axis=2) >= Game.WIN_SCORE_PER_CATEGORY
+        # get_winner keeps the last player that qualifies
+        winners = np.where(has_won[:, 1], 1, np.where(has_won[:, 0], 0, -1))
+        is_ended = winners >= 0
+        self.winners[games] = winners
+        self.states[games] = np.where(is_ended, END, TURN)
+        return ~is_ended
+
+    def deal(self) -> None:
+        games = np.arange(len(self.states))
+        for player in range(Game.PLAYER_LIMIT):
+            players = np.full(len(games), player, dtype=np.int8)
+            for _ in range(HAND_SIZE):
+                self.draw(games, players)
+
+    def step(self, max_actions: int) -> int:
+        games = np.flatnonzero((self.states != END) & (self.actions < max_actions))
+        if len(games) == 0:
+            return 0
+        self.actions[games] += 1
+        rolls = self.rng.random(len(games))
+        is_turn = self.states[games] == TURN
+        self.step_turn(games[is_turn], rolls[is_turn])
+        self.step_counter(games[~is_turn], rolls[~is_turn])
+        return len(games)
+
+    def step_turn(self, games, rolls) -> None:
+        players = self.turns[games]
+        hands = self.hands[games, players]
+        attack_weights = hands * self.table.is_attack
+        attack_totals = attack_weights.sum(axis=1, dtype=np.int16)
+        defend_weights = hands * self.table.is_scoring_defend
+        defend_totals = defend_weights.sum(axis=1, dtype=np.int16)
+        is_attack = (attack_totals > 0) & (rolls < self.attack_rates[players])
+        is_defend = ~is_attack & (defend_totals > 0) & (rolls < self.defend_rates[players])
+        is_skip = ~is_attack & ~is_defend
+
+        # attack_action
+        attack_games, attack_players = games[is_attack], players[is_attack]
+        attack_cards = self.pick(attack_weights[is_attack], attack_totals[is_attack])
+        self.play(attack_games, attack_players, attack_cards)
+        self.states[attack_games] = COUNTER
+        self.stats.count(self.stats.attacks, attack_cards)
+
+        # defend_action
+        defend_games, defend_players = games[is_defend], players[is_defend]
+        defend_cards = self.pick(defend_weights[is_defend], defend_totals[is_defend])
+        self.play(defend_games, defend_players, defend_cards)
+        self.turns[defend_games] = 1 - defend_players
+        self.scores[defend_games, defend_players, self.table.category[defend_cards]] += 1
+        self.stats.count(self.stats.defends, defend_cards)
+        is_going_on = self.end_won(defend_games)
+        self.draw(defend_games[is_going_on], defend_players[is_going_on])
+
+        # skip_action in turn mode
+        skip_games, skip_players = games[is_skip], players[is_skip]
+        self.turns[skip_games] = 1 - skip_players
+        self.draw(skip_games, skip_players)
+
+    def step_counter(self, games, rolls) -> None:
+        attackers = self.turns[games]
+        targets = 1 - attackers
+        attack_cards = self.discarded[games]
+        counter_weights = self.hands[games, targets] * self.table.counters[attack_cards]
+        counter_totals = counter_weights.sum(axis=1, dtype=np.int16)
+        is_counter = (counter_totals > 0) & (rolls < self.counter_rates[targets])
+
+        # counter_action, the attacker draws before the counter card is discarded
+        counter_games, counter_attackers, counter_targets = games[is_counter], attackers[is_counter], targets[is_counter]
+        self.draw(counter_games, counter_attackers)
+        counter_cards = self.pick(counter_weights[is_counter], counter_totals[is_counter])
+        self.play(counter_games, counter_targets, counter_cards)
+        self.states[counter_games] = TURN
+        self.turns[counter_games] = counter_targets
+        self.stats.count(self.stats.counters, counter_cards)
+        self.stats.count(self.stats.attacks_countered, attack_cards[is_counter])
+
+        # skip_action in counter mode, the attack scores
+        skip_games, skip_attackers, skip_targets = games[~is_counter], attackers[~is_counter], targets[~is_counter]
+        skip_categories = self.table.category[attack_cards[~is_counter]]
+        self.scores[skip_games, skip_attackers, skip_categories] += 1
+        self.scores[skip_games, skip_targets, skip_categories] -= 1
+        self.turns[skip_games] = skip_targets
+        self.stats.count(self.stats.attacks_scored, attack_cards[~is_counter])
+        is_going_on = self.end_won(skip_games)
+        self.draw(skip_games[is_going_on], skip_attackers[is_going_on])
+
+    def run(self, max_actions: int) -> None:
+        self.deal()
+        while self.step(max_actions):
+            pass
+
+        finished = np.flatnonzero(self.winners >= 0)
+        self.stats.played_games += self.played[finished].sum(axis=(0, 1))
+        self.stats.won_games += self.played[finished, self.winners[finished]].sum(axis=0)
+
+
+def ratio(numerator: int, denominator: int):
+    return None if denominator == 0 else round(numerator / denominator, 4)
+
+
+def summarize(table: CardTable, stats: CardStats) -> Dict:
+    cards = []
+    for position, card in enumerate(table.cards):
+        attacks_answered = int(stats.attacks_scored[position] + stats.attacks_countered[position])
+        cards.append({
+            "id": card.id,
+            "title": card.title,
+            "cardType": card.card_type.value,
+            "cardCategory": card.card_category.value,
+            "attacks": int(stats.attacks[position]),
+            "defends": int(stats.defends[position]),
+            "counters": int(stats.counters[position]),
+            "counteredRate": ratio(int(stats.attacks_countered[position]), attacks_answered),
+            "winRate": ratio(int(stats.won_games[position]), int(stats.played_games[position]))
+        })
+
+    categories = {}
+    for category in CardCategory:
+        in_category = table.category == SCORE_INDEX[category] if category in SCORE_INDEX else table.category < 0
+        categories[category.value] = {
+            "attacks": int(stats.attacks[in_category].sum()),
+            "defends": int(stats.defends[in_category].sum()),
+            "counters": int(stats.counters[in_category].sum()),
+            "counteredRate": ratio(int(stats.attacks_countered[in_category].sum()),
+                                   int(stats.attacks_scored[in_category].sum() + stats.attacks_countered[in_category].sum())),
+            "winRate": ratio(int(stats.won_games[in_category].sum()), int(stats.played_games[in_category].sum()))
+        }
+    return {"cards": cards, "categories": categories}
+
+
+def print_summary(summary: Dict) -> None:
+    def format_rate(rate) -> str:
+        return "     -" if rate is None else f"{rate * 100:5.1f}%"
+
+    print(f"{'card':>24} {'type':>7} {'category':>8} {'attacks':>10} {'defends':>10} {'counters':>10} {'countered':>9} {'win rate':>8}")
+    for card in summary["cards"]:
+        name = f"{card['id']} {card['title']}"[:24]
+        print(f"{name:>24} {card['cardType']:>7} {card['cardCategory']:>8} {card['attacks']:>10} {card['defends']:>10} "
+              f"{card['counters']:>10} {format_rate(card['counteredRate']):>9} {format_rate(card['winRate']):>8}")
+    for category, category_summary in summary["categories"].items():
+        print(f"{category:>24} {'':>7} {'':>8} {category_summary['attacks']:>10} {category_summary['defends']:>10} "
+              f"{category_summary['counters']:>10} {format_rate(category_summary['counteredRate']):>9} {format_rate(category_summary['winRate']):>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays many games at once as arrays and reports statistics per card.")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=100000, help="games advanced together")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-actions", type=int, default=1000, help="games still running after this many actions count as unfinished")
+    parser.add_argument("--cards", help="card snapshot to play with, generated cards are used without one")
+    parser.add_argument("--strategy", type=parse_strategy, default=Strategy(0.6, 0.3, 0.8),
+                        help="attack,defend,counter rates of the first player, 0.6,0.3,0.8 by default like the load generator bots")
+    parser.add_argument("--opponent-strategy", type=parse_strategy, help="rates of the second player, the first player's by default")
+    parser.add_argument("--output", help="write the statistics as json")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("numpy is not installed, it is only needed for this simulator")
+
+    catalog = load_catalog(args.cards)
+    table = CardTable(catalog)
+    strategies = [args.strategy, args.opponent_strategy or args.strategy]
+    rng = np.random.default_rng(args.seed)
+    stats = CardStats(len(table))
+
+    wins = np.zeros(Game.PLAYER_LIMIT, dtype=np.int64)
+    unfinished_count = 0
+    action_count = 0
+    started_at = time.perf_counter()
+    for batch_start in range(0, args.games, args.batch_size):
+        simulation = BatchSimulation(table, strategies, min(args.batch_size, args.games - batch_start), rng, stats)
+        simulation.run(args.max_actions)
+        wins += np.bincount(simulation.winners[simulation.winners >= 0], minlength=Game.PLAYER_LIMIT)
+        unfinished_count += int((simulation.winners < 0).sum())
+        action_count += int(simulation.actions.sum())
+    elapsed = time.perf_counter() - started_at
+
+    summary = summarize(table, stats)
+    print_summary(summary)
+    print(f"{args.games} games with {catalog} in {elapsed:.2f}s, {args.games / elapsed * 60:.0f} games/min, {action_count / elapsed:.0f} actions/s")
+    print(f"wins: first player {wins[0]}, second player {wins[1]}, unfinished {unfinished_count}, {action_count / args.games:.1f} actions per game")
+
+    if args.output is not None:
+        summary.update({
+            "games": args.games,
+            "strategies": [strategy._asdict() for strategy in strategies],
+            "wins": [int(win_count) for win_count in wins],
+            "unfinished": unfinished_count,
+            "seconds": round(elapsed, 3)
+        })
+        with open(args.output, "w") as output_file:
+            json.dump(summary, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import timeit
+from array import array
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from card import Card, CardType, CardCategory, CardSubCategory
+from codec import CODECS, JsonCodec
+from events.play.attack import AttackActionPlayServerEvent
+from events.play.counter import CounterActionPlayEventResult
+from events.play.defend import DefendActionPlayServerEvent
+from events.play.draw import DrawActionPlayServerEvent
+from events.play.skip import SkipActionPlayServerEvent
+from events.play.turn import TurnActionPlayServerEvent
+
+ROUNDS = 20000
+
+
+def create_cards() -> List[Card]:
+    description = "Attackers trick users into revealing their passwords through a fake login page that looks like the real one."
+    cards = []
+    for card_id, (card_type, card_category) in enumerate([
+        (CardType.ATTACK, CardCategory.RED),
+        (CardType.ATTACK, CardCategory.ORANGE),
+        (CardType.DEFEND, CardCategory.BLUE),
+        (CardType.DEFEND, CardCategory.WILD),
+        (CardType.ATTACK, CardCategory.BLUE),
+    ]):
+        cards.append(Card(
+            card_id,
+            f"Card {card_id}",
+            f"{card_type.value}_{card_category.value}_{card_id}.jpg",
+            description,
+            card_type,
+            card_category,
+            [CardSubCategory.SQUARE, CardSubCategory.CIRCLE]
+        ))
+    return cards
+
+
+def create_payloads() -> List[Tuple[str, Dict]]:
+    cards = create_cards()
+    # in SCORE_CATEGORIES order, red, orange and blue
+    scores = {
+        "player one": array("i", [1, 0, 2]),
+        "player two": array("i", [0, 1, 0]),
+    }
+    return [
+        ("draw x5", DrawActionPlayServerEvent(True, cards).to_dict()),
+        ("draw x1", DrawActionPlayServerEvent(True, cards[:1]).to_dict()),
+        ("attack", AttackActionPlayServerEvent(True, "player one", "player two", cards[0]).to_dict()),
+        ("defend", DefendActionPlayServerEvent(True, "player one", cards[2], scores).to_dict()),
+        ("counter", CounterActionPlayEventResult(True, "player two", cards[3], scores).to_dict()),
+        ("skip", SkipActionPlayServerEvent(True, "player two", scores).to_dict()),
+        ("turn", TurnActionPlayServerEvent(True, "player one").to_dict()),
+    ]
+
+
+def main() -> None:
+    payloads = create_payloads()
+
+    # the stdlib path the server used before the codec layer
+    baseline = JsonCodec()
+
+    for codec_name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except ImportError:
+            print(f"{codec_name}: not installed, skipped")
+            continue
+
+        print(f"== {codec_name}")
+        for payload_name, payload in payloads:
+            frame = codec.encode(payload)
+            assert baseline.decode(frame) == baseline.decode(baseline.encode(payload))
+
+            encode_us = timeit.timeit(lambda: codec.encode(payload), number=ROUNDS) / ROUNDS * 1e6
+            decode_us = timeit.timeit(lambda: codec.decode(frame), number=ROUNDS) / ROUNDS * 1e6
+            print(f"{payload_name:>10}: {len(frame):5d} bytes  encode {encode_us:6.2f} us  decode {decode_us:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
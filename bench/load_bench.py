@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+# plays full games against a running server, or one started with --spawn, two simulated clients per game
+# every client decides from its own seeded random, with --spawn the server deck seed is fixed as well
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RECEIVE_TIMEOUT = 30.0
+SERVER_START_TIMEOUT = 30.0
+PLAY_ACTIONS = ("attack", "defend", "counter", "skip")
+# the field of a play broadcast that names the player who acted
+ACTION_PLAYER_FIELDS = {"attack": "playerAttack", "defend": "playerDefend", "counter": "playerCounter", "skip": "playerSkip"}
+
+
+class LoadStats:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {action: [] for action in PLAY_ACTIONS}
+        self.games_finished = 0
+        self.games_failed = 0
+        self.rejected_actions = 0
+        self.errors: Dict[str, int] = {}
+
+    def fail(self, reason: str) -> None:
+        self.games_failed += 1
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+class BotPlayer:
+    # plays by the rules, so the server only rejects an action when the bot and the server disagree
+    def __init__(self, name: str, rng: random.Random, stats: LoadStats) -> None:
+        self.name = name
+        self.rng = rng
+        self.stats = stats
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.hand: Dict[int, Dict] = {}
+        # action waiting for its broadcast, and when it was sent
+        self.pending: Optional[Tuple[str, float]] = None
+
+    async def connect(self, session: aiohttp.ClientSession, url: str) -> None:
+        self.ws = await session.ws_connect(url)
+        await self.send({"type": "signin", "playerName": self.name})
+        await self.receive_until(lambda event: event.get("type") == "signin")
+
+    async def send(self, event: Dict) -> None:
+        await self.ws.send_str(json.dumps(event))
+
+    async def receive(self) -> Dict:
+        msg = await asyncio.wait_for(self.ws.receive(), RECEIVE_TIMEOUT)
+        if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+            raise ConnectionError(f"connection closed ({msg.type.name.lower()})")
+        return json.loads(msg.data)
+
+    async def receive_until(self, predicate) -> Dict:
+        while True:
+            event = await self.receive()
+            if predicate(event):
+                return event
+
+    async def act(self, action: str, card: Optional[Dict] = None) -> None:
+        event = {"type": "play", "action": action}
+        if card is not None:
+            event["cardId"] = card["id"]
+            del self.hand[card["id"]]
+        self.pending = (action, time.perf_counter())
+        await self.send(event)
+
+    async def take_turn(self) -> None:
+        attack_cards = [card for card in self.hand.values() if card["cardType"] == "attack"]
+        defend_cards = [card for card in self.hand.values() if card["cardType"] == "defend" and card["cardCategory"] != "wild"]
+        roll = self.rng.random()
+        if attack_cards and roll < 0.6:
+            await self.act("attack", self.rng.choice(attack_cards))
+        elif defend_cards and roll < 0.9:
+            await self.act("defend", self.rng.choice(defend_cards))
+        else:
+            await self.act("skip")
+
+    async def answer_attack(self, attack_card: Dict) -> None:
+        counter_cards = [
+            card for card in self.hand.values()
+            if card["cardType"] == "defend"
+            and card["cardCategory"] in ("wild", attack_card["cardCategory"])
+            and set(card["cardSubCategories"]) & set(attack_card["cardSubCategories"])
+        ]
+        if counter_cards and self.rng.random() < 0.8:
+            await self.act("counter", self.rng.choice(counter_cards))
+        else:
+            await self.act("skip")
+
+    async def play(self) -> None:
+        while True:
+            event = await self.receive()
+            event_type = event.get("type")
+            if event_type == "leave":
+                raise ConnectionError("opponent left")
+            if event_type != "play":
+                continue
+
+            action = event.get("action")
+            if action == "draw":
+                for card in event["cards"]:
+                    self.hand[card["id"]] = card
+                continue
+            if action == "end":
+                return
+
+            if not event["result"]:
+                # only the acting player gets a failed result, the turn is given up instead
+                self.stats.rejected_actions += 1
+                rejected_action = None if self.pending is None else self.pending[0]
+                self.pending = None
+                if rejected_action is not None and rejected_action != "skip":
+                    await self.act("skip")
+                continue
+
+            if self.pending is not None and self.pending[0] == action and event.get(ACTION_PLAYER_FIELDS.get(action)) == self.name:
+                self.stats.latencies[action].append(time.perf_counter() - self.pending[1])
+                self.pending = None
+
+            if action == "turn" and event["playerTurn"] == self.name:
+                await self.take_turn()
+            elif action == "attack" and event["playerTarget"] == self.name:
+                await self.answer_attack(event["card"])
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+
+
+async def run_game(session: aiohttp.ClientSession, url: str, seed: int, game_index: int, stats: LoadStats) -> None:
+    host = BotPlayer(f"host {game_index}", random.Random(f"{seed}:{game_index}:host"), stats)
+    guest = BotPlayer(f"guest {game_index}", random.Random(f"{seed}:{game_index}:guest"), stats)
+    try:
+        await host.connect(session, url)
+        await guest.connect(session, url)
+
+        await host.send({"type": "create", "gameName": f"load {game_index}"})
+        created = await host.receive_until(lambda event: event.get("type") == "create")
+        await guest.send({"type": "join", "gameId": created["gameId"]})
+        await host.receive_until(lambda event: event.get("type") == "join" and event.get("playerJoin") == guest.name)
+        await host.send({"type": "start"})
+
+        play_tasks = [asyncio.create_task(host.play()), asyncio.create_task(guest.play())]
+        try:
+            await asyncio.gather(*play_tasks)
+        finally:
+            # one player failing leaves the other waiting for a move that never comes
+            for play_task in play_tasks:
+                play_task.cancel()
+            await asyncio.gather(*play_tasks, return_exceptions=True)
+        stats.games_finished += 1
+    except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError, KeyError) as e:
+        stats.fail(type(e).__name__ if not str(e) else f"{type(e).__name__}: {e}")
+    finally:
+        await host.close()
+        await guest.close()
+
+
+def read_process_usage(pid: Optional[int]) -> Optional[Tuple[float, int]]:
+    # cpu seconds and resident bytes of the server, linux only
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            fields = stat_file.read().rpartition(")")[2].split()
+        with open(f"/proc/{pid}/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except OSError:
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return cpu_seconds, resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def sample_peak_memory(pid: Optional[int], peak: List[int]) -> None:
+    while True:
+        usage = read_process_usage(pid)
+        if usage is not None:
+            peak[0] = max(peak[0], usage[1])
+        await asyncio.sleep(0.2)
+
+
+async def wait_for_server(url: str, server: Optional[subprocess.Popen]) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.ws_connect(url):
+                    return
+            except aiohttp.ClientError:
+                if server is not None and server.poll() is not None:
+                    raise RuntimeError(f"Server exited with {server.returncode}, run with --server-output to see why")
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    sorted_values = sorted(latencies)
+    return {
+        "count": len(sorted_values),
+        "p50_ms": percentile(sorted_values, 0.50) * 1000,
+        "p90_ms": percentile(sorted_values, 0.90) * 1000,
+        "p99_ms": percentile(sorted_values, 0.99) * 1000,
+        "max_ms": (sorted_values[-1] if sorted_values else 0.0) * 1000
+    }
+
+
+async def run_load(args: argparse.Namespace, server: Optional[subprocess.Popen]) -> Dict:
+    await wait_for_server(args.url, server)
+    server_pid = server.pid if server is not None else args.server_pid
+
+    stats = LoadStats()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # two sockets per running game
+    connector = aiohttp.TCPConnector(limit=0)
+
+    async def run_limited(session: aiohttp.ClientSession, game_index: int) -> None:
+        async with semaphore:
+            await run_game(session, args.url, args.seed, game_index, stats)
+
+    peak_memory = [0]
+    usage_before = read_process_usage(server_pid)
+    memory_task = asyncio.create_task(sample_peak_memory(server_pid, peak_memory))
+    started_at = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[run_limited(session, game_index) for game_index in range(args.games)])
+    elapsed = time.perf_counter() - started_at
+    memory_task.cancel()
+    usage_after = read_process_usage(server_pid)
+
+    all_latencies = [latency for latencies in stats.latencies.values() for latency in latencies]
+    results = {
+        "games": args.games,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "games_finished": stats.games_finished,
+        "games_failed": stats.games_failed,
+        "errors": stats.errors,
+        "rejected_actions": stats.rejected_actions,
+        "elapsed_s": elapsed,
+        "games_per_s": stats.games_finished / elapsed,
+        "actions_per_s": len(all_latencies) / elapsed,
+        "latency": {"all": summarize_latencies(all_latencies), **{
+            action: summarize_latencies(latencies) for action, latencies in stats.latencies.items()
+        }}
+    }
+    if usage_before is not None and usage_after is not None:
+        results["server"] = {
+            "cpu_ms_per_game": (usage_after[0] - usage_before[0]) / max(stats.games_finished, 1) * 1000,
+            "rss_start_mb": usage_before[1] / 2 ** 20,
+            "rss_peak_mb": peak_memory[0] / 2 ** 20,
+            # games running at the same time are what the server holds in memory
+            "rss_kb_per_concurrent_game": (peak_memory[0] - usage_before[1]) / min(args.concurrency, args.games) / 1024
+        }
+    return results
+
+
+def print_results(results: Dict) -> None:
+    print(f"games: {results['games_finished']} finished, {results['games_failed']} failed in {results['elapsed_s']:.2f}s "
+          f"({results['games_per_s']:.1f} games/s, {results['actions_per_s']:.0f} actions/s)")
+    for reason, count in results["errors"].items():
+        print(f"  failed: {count} x {reason}")
+    if results["rejected_actions"]:
+        print(f"  rejected actions: {results['rejected_actions']}")
+    for action, summary in results["latency"].items():
+        print(f"{action:>8}: {summary['count']:7d} actions  p50 {summary['p50_ms']:7.2f} ms  "
+              f"p90 {summary['p90_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms  max {summary['max_ms']:7.2f} ms")
+    server = results.get("server")
+    if server is not None:
+        print(f"  server: {server['cpu_ms_per_game']:.2f} ms cpu per game, rss {server['rss_start_mb']:.1f} -> {server['rss_peak_mb']:.1f} MB "
+              f"({server['rss_kb_per_concurrent_game']:.1f} KB per concurrent game)")
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    if results["actions_per_s"] < baseline["actions_per_s"] * (1 - tolerance):
+        regressions.append(f"throughput {results['actions_per_s']:.0f} actions/s, baseline {baseline['actions_per_s']:.0f}")
+    for key in ("p50_ms", "p99_ms"):
+        value = results["latency"]["all"][key]
+        baseline_value = baseline["latency"]["all"][key]
+        if value > baseline_value * (1 + tolerance):
+            regressions.append(f"{key} {value:.2f}, baseline {baseline_value:.2f}")
+    if results["games_failed"] > baseline["games_failed"]:
+        regressions.append(f"{results['games_failed']} failed games, baseline {baseline['games_failed']}")
+    return regressions
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    # listens on 8080, with SHARDS set only the front process is measured
+    env = dict(os.environ, GAME_SEED=str(args.seed))
+    # logs are written off the event loop, they still cost cpu
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")],
+        cwd=args.server_dir,
+        env=env,
+        stdout=subprocess.DEVNULL if not args.server_output else None,
+        stderr=subprocess.DEVNULL if not args.server_output else None
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays full games against the server and reports throughput and latency.")
+    parser.add_argument("--url", default="ws://127.0.0.1:8080/ws")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100, help="games played at the same time, two clients each")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spawn", action="store_true", help="start a server for the run, configured through the environment")
+    parser.add_argument("--server-pid", type=int, help="measure cpu and memory of an already running server")
+    parser.add_argument("--server-output", action="store_true", help="show the output of a spawned server")
+    parser.add_argument("--server-dir", default=ROOT, help="working directory of a spawned server, it serves ./www from there")
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--baseline", help="results json of an earlier run, exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    server = start_server(args) if args.spawn else None
+    try:
+        results = asyncio.run(run_load(args, server))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
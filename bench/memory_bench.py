@@ -0,0 +1,83 @@
+import gc
+import os
+import sys
+import tracemalloc
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from card import CardManager
+from deck import Deck
+from game import GameManager, GameState
+from hand import Hand
+from player import Player
+
+COUNT = 10000
+
+
+class IdleWebSocket:
+    pass
+
+
+def create_card_manager() -> CardManager:
+    card_mgr = CardManager()
+    rows = []
+    for card_id in range(60):
+        card_type = "attack" if card_id % 2 == 0 else "defend"
+        card_category = ["red", "orange", "blue"][card_id % 3]
+        rows.append([str(card_id), card_type, card_category, "square,circle", f"Card {card_id}", "Description", f"{card_id}.jpg"])
+    card_mgr.catalog = card_mgr.build_catalog(rows)
+    return card_mgr
+
+
+def measure(setup: Callable[[], List], create: Callable[[List], List]) -> float:
+    gc.collect()
+    setup_objects = setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create(setup_objects)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects, setup_objects
+    return (after - before) / COUNT
+
+
+def create_players(_: List) -> List[Player]:
+    return [Player(IdleWebSocket(), f"player {i}") for i in range(COUNT)]
+
+
+def create_idle_games(players: List[Player]) -> List:
+    game_mgr = GameManager(0)
+    return [game_mgr, [game_mgr.create_game(f"game {i}", player) for i, player in enumerate(players)]]
+
+
+def create_started_games(players: List[Player]) -> List:
+    card_mgr = create_card_manager()
+    game_mgr = GameManager(0)
+    games = []
+    for i in range(0, COUNT * 2, 2):
+        game = game_mgr.create_game(f"game {i}", players[i])
+        game.join(players[i + 1])
+        game.game_state = GameState.TURN
+        game.catalog = card_mgr.catalog
+        game.deck = Deck(game.catalog.deck_card_ids, game.seed)
+        for game_player in game.players:
+            game.players_hand[game_player] = Hand(game.deck.draw_many(5))
+        games.append(game)
+    return [card_mgr, game_mgr, games]
+
+
+def main() -> None:
+    player_bytes = measure(lambda: [], create_players)
+    idle_game_bytes = measure(lambda: create_players([]), create_idle_games)
+    started_game_bytes = measure(lambda: create_players([]) + create_players([]), create_started_games)
+
+    print(f"connected player: {player_bytes:8.0f} bytes")
+    print(f"       idle game: {idle_game_bytes:8.0f} bytes (host excluded)")
+    print(f"    started game: {started_game_bytes:8.0f} bytes (2 players excluded, shared catalog included once)")
+
+
+if __name__ == "__main__":
+    main()
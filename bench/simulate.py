@@ -0,0 +1,130 @@
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from card import CardManager, CardCatalog, CardDatabaseMode, CardType, CardCategory
+from events.play import apply_action
+from events.play.attack import AttackActionPlayClientEvent
+from events.play.counter import CounterActionPlayClientEvent
+from events.play.defend import DefendActionPlayClientEvent
+from events.play.skip import SkipActionPlayClientEvent
+from events.schema import ClientEvent
+from events.start import deal_game
+from game import Game, GameState
+from player import Player
+
+# plays whole games through the same rules as the websocket handlers, without sockets or an event loop
+
+
+def create_catalog() -> CardCatalog:
+    card_mgr = CardManager()
+    rows = []
+    for card_id in range(60):
+        card_type = "attack" if card_id % 2 == 0 else "defend"
+        card_category = ["red", "orange", "blue", "wild"][card_id // 2 % 4] if card_type == "defend" else ["red", "orange", "blue"][card_id // 2 % 3]
+        card_sub_categories = ["square,circle", "triangle", "circle,triangle"][card_id % 3]
+        rows.append([str(card_id), card_type, card_category, card_sub_categories, f"Card {card_id}", "Description", f"{card_id}.jpg"])
+    return card_mgr.build_catalog(rows)
+
+
+def load_catalog(snapshot_path: Optional[str]) -> CardCatalog:
+    if snapshot_path is None:
+        return create_catalog()
+    card_mgr = CardManager()
+    card_mgr.mode = CardDatabaseMode.OFFLINE
+    card_mgr.snapshot_path = snapshot_path
+    card_mgr.load()
+    return card_mgr.catalog
+
+
+def choose_action(game: Game, rng: random.Random) -> ClientEvent:
+    # the strategy of the load generator bots: mostly attack, sometimes defend, counter whenever it can
+    if game.game_state is GameState.COUNTER:
+        player = game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT]
+        attack_card = game.discarded
+        counter_card_ids = [
+            card_id for card_id in game.players_hand[player]
+            if game.catalog.cards[card_id].card_type is CardType.DEFEND
+            and game.catalog.cards[card_id].card_category in (CardCategory.WILD, attack_card.card_category)
+            and set(game.catalog.cards[card_id].card_sub_categories) & set(attack_card.card_sub_categories)
+        ]
+        if counter_card_ids and rng.random() < 0.8:
+            return CounterActionPlayClientEvent(rng.choice(counter_card_ids))
+        return SkipActionPlayClientEvent()
+
+    player = game.players[game.player_turn_no]
+    attack_card_ids = [card_id for card_id in game.players_hand[player] if game.catalog.cards[card_id].card_type is CardType.ATTACK]
+    defend_card_ids = [
+        card_id for card_id in game.players_hand[player]
+        if game.catalog.cards[card_id].card_type is CardType.DEFEND and game.catalog.cards[card_id].card_category is not CardCategory.WILD
+    ]
+    roll = rng.random()
+    if attack_card_ids and roll < 0.6:
+        return AttackActionPlayClientEvent(rng.choice(attack_card_ids))
+    if defend_card_ids and roll < 0.9:
+        return DefendActionPlayClientEvent(rng.choice(defend_card_ids))
+    return SkipActionPlayClientEvent()
+
+
+def acting_player(game: Game) -> Player:
+    if game.game_state is GameState.COUNTER:
+        return game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT]
+    return game.players[game.player_turn_no]
+
+
+def play_game(game_id: int, catalog: CardCatalog, rng: random.Random, max_actions: int) -> Dict:
+    game = Game(game_id, f"game {game_id}", Player(None, "player one"), rng.getrandbits(32))
+    game.join(Player(None, "player two"))
+    output_count = len(deal_game(game, catalog))
+
+    action_count = 0
+    while game.game_state is not GameState.END and action_count < max_actions:
+        output_count += len(apply_action(choose_action(game, rng), acting_player(game), game))
+        action_count += 1
+
+    winner = game.get_winner() if game.game_state is GameState.END else None
+    return {
+        "winner": None if winner is None else game.players.index(winner),
+        "actions": action_count,
+        "outputs": output_count
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays games in process through the game rules and reports throughput and outcomes.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-actions", type=int, default=1000, help="games still running after this many actions count as unfinished")
+    parser.add_argument("--cards", help="card snapshot to play with, generated cards are used without one")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.cards)
+    rng = random.Random(args.seed)
+
+    wins: List[int] = [0, 0]
+    unfinished_count = 0
+    action_count = 0
+    output_count = 0
+    started_at = time.perf_counter()
+    for game_id in range(args.games):
+        result = play_game(game_id, catalog, rng, args.max_actions)
+        action_count += result["actions"]
+        output_count += result["outputs"]
+        if result["winner"] is None:
+            unfinished_count += 1
+        else:
+            wins[result["winner"]] += 1
+    elapsed = time.perf_counter() - started_at
+
+    print(f"{args.games} games with {catalog} in {elapsed:.2f}s, {args.games / elapsed:.0f} games/s, {action_count / elapsed:.0f} actions/s")
+    print(f"wins: first player {wins[0]}, second player {wins[1]}, unfinished {unfinished_count}")
+    print(f"per game: {action_count / args.games:.1f} actions, {output_count / args.games:.1f} outputs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
+import asyncio
+import hashlib
 import json
 import os
 from enum import StrEnum
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 import gspread
 
+from codec import EncodedDict
+from log import get_logger
+
+log = get_logger("card_manager", is_tagged=False)
+
 
 class CardType(StrEnum):
     ATTACK = "attack"
@@ -26,6 +33,8 @@ class CardSubCategory(StrEnum):
 
 
 class Card:
+    __slots__ = ("id", "title", "image", "description", "card_type", "card_category", "card_sub_categories", "wire")
+
     def __init__(self, id: int, title: str, image: str, description: str, card_type: CardType, card_category: CardCategory, card_sub_categories: List[CardSubCategory]) -> None:
         self.id = id
         self.title = title
@@ -35,26 +44,131 @@ class Card:
         self.card_category = card_category
         self.card_sub_categories = card_sub_categories
 
+        # cards never change after load, so the wire format is built and encoded once here
+        # and shared by every event that ships this card
+        self.wire = EncodedDict({
+            "id": self.id,
+            "title": self.title,
+            "image": self.image,
+            "description": self.description,
+            "cardType": self.card_type.value,
+            "cardCategory": self.card_category.value,
+            "cardSubCategories": [card_sub_category.value for card_sub_category in self.card_sub_categories]
+        })
+
     def __str__(self) -> str:
         sub_categories_str = ", ".join([str(sc.value) for sc in self.card_sub_categories])
         return f"+{self.title} : {self.card_type.value} : {self.card_category.value} : [{sub_categories_str}]+"
 
 
+class CardDatabaseMode(StrEnum):
+    # always fetch from the sheet at boot
+    LIVE = "live"
+    # boot from the snapshot, refresh from the sheet in the background when credentials are set
+    CACHED = "cached"
+    # only ever use the snapshot
+    OFFLINE = "offline"
+
+
+class CardCatalog:
+    # a complete, never mutated set of card definitions, swapped as a whole on reload
+    __slots__ = ("version", "rows_hash", "deck", "deck_card_ids", "cards")
+
+    def __init__(self, version: int, rows_hash: str, deck: List[Card]) -> None:
+        self.version = version
+        self.rows_hash = rows_hash
+        self.deck: Tuple[Card, ...] = tuple(deck)
+        self.deck_card_ids: Tuple[int, ...] = tuple(card.id for card in deck)
+        self.cards: Dict[int, Card] = {card.id: card for card in deck}
+
+    def __str__(self) -> str:
+        return f"<catalog v{self.version} : {len(self.deck)} cards>"
+
+
 class CardManager:
+    SNAPSHOT_VERSION = 1
+
     def __init__(self):
-        self.deck: List[Card] = []
-        self.deck_card_ids: List[int] = []
-        self.cards: Dict[int, Card] = {}
+        self.catalog = CardCatalog(0, "", [])
+        self.reload_lock = asyncio.Lock()
+
+        self.mode = CardDatabaseMode(os.getenv("CARD_DB_MODE", CardDatabaseMode.CACHED))
+        self.snapshot_path = os.getenv("CARD_SNAPSHOT", "./cards.json")
+        self.is_from_snapshot = False
+
+    @property
+    def deck(self) -> Tuple[Card, ...]:
+        return self.catalog.deck
+
+    @property
+    def deck_card_ids(self) -> Tuple[int, ...]:
+        return self.catalog.deck_card_ids
+
+    @property
+    def cards(self) -> Dict[int, Card]:
+        return self.catalog.cards
+
+    def load(self):
+        if self.mode == CardDatabaseMode.OFFLINE:
+            if not self.load_snapshot():
+                raise RuntimeError(f"No card snapshot at {self.snapshot_path}")
+        elif self.mode == CardDatabaseMode.LIVE or not self.load_snapshot():
+            self.fetch_from_database()
+
+    def is_refresh_enabled(self) -> bool:
+        return self.mode == CardDatabaseMode.CACHED and self.is_from_snapshot and os.getenv("GS_CRED") is not None
+
+    def is_database_configured(self) -> bool:
+        return self.mode != CardDatabaseMode.OFFLINE and os.getenv("GS_CRED") is not None
 
     def fetch_from_database(self):
+        rows = self.fetch_rows_from_database()
+        self.catalog = self.build_catalog(rows)
+        self.save_snapshot(rows)
+        self.is_from_snapshot = False
+
+    async def refresh_from_database(self):
+        try:
+            await self.reload(from_database=True)
+        except Exception as e:
+            log.info("[Card Manager]", "Refresh from database failed: %r", e)
+
+    async def reload(self, from_database: bool) -> bool:
+        # everything slow runs in a worker thread, only the final swap happens on the event loop
+        async with self.reload_lock:
+            loop = asyncio.get_running_loop()
+            if from_database:
+                rows = await loop.run_in_executor(None, self.fetch_rows_from_database)
+            else:
+                rows = await loop.run_in_executor(None, self.read_snapshot_rows)
+                if rows is None:
+                    raise RuntimeError(f"No valid card snapshot at {self.snapshot_path}")
+
+            if hash_rows(rows) == self.catalog.rows_hash:
+                log.info("[Card Manager]", "Card definitions are up to date at %s.", self.catalog)
+                return False
+
+            catalog = await loop.run_in_executor(None, self.build_catalog, rows)
+            if from_database:
+                await loop.run_in_executor(None, self.save_snapshot, rows)
+
+            self.catalog = catalog
+            log.info("[Card Manager]", "Reloaded card definitions as %s.", self.catalog)
+            return True
+
+    def fetch_rows_from_database(self) -> List[List[str]]:
         gs_cred = os.getenv("GS_CRED")
         sheet_id = os.getenv("GS_SHEET_ID")
         gs_client = gspread.service_account_from_dict(json.loads(gs_cred))
         sheet = gs_client.open_by_key(sheet_id)
         worksheet = sheet.get_worksheet(0)
         database = worksheet.get_all_values()
-        for row_no in range(1, len(database)):
-            row: Tuple[str, str, str, str, str, str, str] = database[row_no]
+        # first row is the header
+        return database[1:]
+
+    def build_catalog(self, rows: List[List[str]]) -> CardCatalog:
+        deck: List[Card] = []
+        for row in rows:
             row_val_id, row_val_type, row_val_category, row_val_sub_categories, row_val_title, row_val_description, row_val_image = row
 
             card = Card(
@@ -66,7 +180,49 @@ class CardManager:
                 CardCategory[row_val_category.upper()],
                 [CardSubCategory[row_val_sub_category.upper()] for row_val_sub_category in row_val_sub_categories.split(",")]
             )
+            deck.append(card)
+
+        return CardCatalog(self.catalog.version + 1, hash_rows(rows), deck)
+
+    def read_snapshot_rows(self) -> Optional[List[List[str]]]:
+        try:
+            with open(self.snapshot_path, "rb") as snapshot_file:
+                snapshot = json.loads(snapshot_file.read())
+        except FileNotFoundError:
+            log.info("[Card Manager]", "No snapshot at %s.", self.snapshot_path)
+            return None
+        except ValueError:
+            log.info("[Card Manager]", "Snapshot at %s is not valid JSON. Ignoring.", self.snapshot_path)
+            return None
+
+        rows = snapshot.get("rows")
+        if snapshot.get("version") != self.SNAPSHOT_VERSION or rows is None or hash_rows(rows) != snapshot.get("hash"):
+            log.info("[Card Manager]", "Snapshot at %s is outdated or corrupted. Ignoring.", self.snapshot_path)
+            return None
+
+        return rows
+
+    def load_snapshot(self) -> bool:
+        rows = self.read_snapshot_rows()
+        if rows is None:
+            return False
+
+        self.catalog = self.build_catalog(rows)
+        self.is_from_snapshot = True
+        return True
+
+    def save_snapshot(self, rows: List[List[str]]):
+        snapshot = {
+            "version": self.SNAPSHOT_VERSION,
+            "hash": hash_rows(rows),
+            "rows": rows
+        }
+        # write then rename, so a crash never leaves a half written snapshot behind
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump(snapshot, snapshot_file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.snapshot_path)
+
 
-            self.deck.append(card)
-            self.deck_card_ids.append(card.id)
-            self.cards[card.id] = card
+def hash_rows(rows: List[List[str]]) -> str:
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from typing import Dict, Union, Optional, List
+
+import metrics
+import tracing
+
+
+class CodecDecodeError(ValueError):
+    pass
+
+
+class EncodedDict(dict):
+    # a dict that never changes, with its JSON encoded once, codecs that can embed raw JSON write that instead
+    __slots__ = ("json",)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.json = json.dumps(self, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JsonCodec:
+    name = "json"
+
+    def __init__(self) -> None:
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self.decoder = json.JSONDecoder()
+
+    def encode(self, event: Dict) -> bytes:
+        return self.encoder.encode(event).encode("utf-8")
+
+    def encode_text(self, event: Dict) -> str:
+        return self.encoder.encode(event)
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        try:
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            return self.decoder.decode(data)
+        except ValueError as e:
+            raise CodecDecodeError(str(e)) from e
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+        self.orjson = orjson
+        # orjson 3.9.15 and later embed raw JSON, subclasses are then passed to encode_subclass to find encoded dicts
+        self.option = orjson.OPT_PASSTHROUGH_SUBCLASS if hasattr(orjson, "Fragment") else 0
+
+    def encode(self, event: Dict) -> bytes:
+        return self.orjson.dumps(event, default=self.encode_subclass, option=self.option)
+
+    def encode_text(self, event: Dict) -> str:
+        return self.encode(event).decode("utf-8")
+
+    def encode_subclass(self, value):
+        if isinstance(value, EncodedDict):
+            return self.orjson.Fragment(value.json)
+        for base in (dict, list, str, int):
+            if isinstance(value, base):
+                return base(value)
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        try:
+            return self.orjson.loads(data)
+        except self.orjson.JSONDecodeError as e:
+            raise CodecDecodeError(str(e)) from e
+
+
+class MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+        self.msgspec = msgspec
+        self.encoder = msgspec.json.Encoder()
+        self.decoder = msgspec.json.Decoder()
+
+    def encode(self, event: Dict) -> bytes:
+        return self.encoder.encode(event)
+
+    def encode_text(self, event: Dict) -> str:
+        return self.encoder.encode(event).decode("utf-8")
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        try:
+            return self.decoder.decode(data)
+        except self.msgspec.DecodeError as e:
+            raise CodecDecodeError(str(e)) from e
+
+
+Codec = Union[JsonCodec, OrjsonCodec, MsgspecCodec]
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+}
+
+# fastest first, used when no codec is configured
+CODEC_PREFERENCE: List[str] = [OrjsonCodec.name, MsgspecCodec.name, JsonCodec.name]
+
+
+def create_codec(name: Optional[str] = None) -> Codec:
+    if name is not None and name != "auto":
+        return CODECS[name]()
+
+    for codec_name in CODEC_PREFERENCE:
+        try:
+            return CODECS[codec_name]()
+        except ImportError:
+            continue
+    return JsonCodec()
+
+
+current_codec: Codec = create_codec(os.getenv("JSON_CODEC"))
+
+
+def get_codec() -> Codec:
+    return current_codec
+
+
+def encode(event: Dict) -> bytes:
+    encode_start = time.perf_counter()
+    frame = current_codec.encode(event)
+    observe_encode(time.perf_counter() - encode_start)
+    return frame
+
+
+def encode_text(event: Dict) -> str:
+    # for sockets that can only send text frames from a str, the stdlib codec then never goes through bytes
+    encode_start = time.perf_counter()
+    frame = current_codec.encode_text(event)
+    observe_encode(time.perf_counter() - encode_start)
+    return frame
+
+
+def observe_encode(encode_seconds: float) -> None:
+    metrics.encode_seconds.observe(encode_seconds)
+    trace = tracing.current_trace.get()
+    if trace is not None:
+        trace.add("encode", encode_seconds)
+
+
+def decode(data: Union[str, bytes]) -> Dict:
+    return current_codec.decode(data)
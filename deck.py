@@ -0,0 +1,61 @@
+import random
+from array import array
+from typing import Sequence, List, Tuple
+
+
+class Deck:
+    __slots__ = ("card_ids", "random", "stack", "cursor", "discard_pile")
+
+    def __init__(self, card_ids: Sequence[int], seed: int) -> None:
+        # shared with the catalog, only copied when a fresh set of cards is opened
+        self.card_ids = card_ids
+        self.random = random.Random(seed)
+
+        # cards at and after the cursor are still in the deck, cards before it were drawn
+        self.stack = array("i", self.card_ids)
+        self.random.shuffle(self.stack)
+        self.cursor = 0
+        self.discard_pile = array("i")
+
+    def draw(self) -> int:
+        if self.cursor == len(self.stack):
+            self.reshuffle()
+
+        card_id = self.stack[self.cursor]
+        self.cursor += 1
+        return card_id
+
+    def draw_many(self, k: int) -> List[int]:
+        return [self.draw() for _ in range(k)]
+
+    def discard(self, card_id: int) -> None:
+        self.discard_pile.append(card_id)
+
+    def reshuffle(self) -> None:
+        # every card is held in hands when nothing was discarded yet, open a fresh set of cards instead
+        if len(self.discard_pile) > 0:
+            self.stack = self.discard_pile
+            self.discard_pile = array("i")
+        else:
+            self.stack = array("i", self.card_ids)
+        self.random.shuffle(self.stack)
+        self.cursor = 0
+
+    def snapshot(self) -> Tuple[bytes, int, bytes]:
+        return self.stack.tobytes(), self.cursor, self.discard_pile.tobytes()
+
+    @classmethod
+    def from_snapshot(cls, card_ids: Sequence[int], seed: int, stack: bytes, cursor: int, discard_pile: bytes) -> "Deck":
+        deck = cls.__new__(cls)
+        deck.card_ids = card_ids
+        # the generator state is not stored, a restored deck reshuffles from a seed derived from where it stopped
+        deck.random = random.Random(f"{seed}:{cursor}:{len(discard_pile)}")
+        deck.stack = array("i")
+        deck.stack.frombytes(stack)
+        deck.cursor = cursor
+        deck.discard_pile = array("i")
+        deck.discard_pile.frombytes(discard_pile)
+        return deck
+
+    def __len__(self) -> int:
+        return len(self.stack) - self.cursor
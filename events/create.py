@@ -1,10 +1,21 @@
-import logging
 from typing import Optional, Dict
 
 from card import CardManager
+from events.schema import ClientEvent
 from game import GameManager
+from log import get_logger
 from player import Player
 
+log = get_logger("create")
+
+
+class CreateClientEvent(ClientEvent):
+    __slots__ = ("game_name",)
+    TYPE = "create"
+    FIELDS = (("gameName", "game_name", str),)
+
+    game_name: str
+
 
 class CreateServerEvent:
     def __init__(self,
@@ -24,21 +35,17 @@ class CreateServerEvent:
         }
 
 
-async def create_event_handler(event: Dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('create') Handling event.")
+async def create_event_handler(event: CreateClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
 
     if player.game_id is None:
-        if "gameName" not in event:
-            logging.info(f"{player}: ('create') Missing values. Skipping.")
-            return
-
-        game_name = event["gameName"]
+        game_name = event.game_name
 
         created_game = game_mgr.create_game(game_name, player)
         player.game_id = created_game.game_id
 
         await player.send_event(CreateServerEvent(True, created_game.game_id, created_game.game_name).to_dict())
-        logging.info(f"{player}: ('create') Created {created_game}.")
+        log.info(player, "Created %s.", created_game)
     else:
-        logging.info(f"{player}: ('create') Already in a room.")
+        log.info(player, "Already in a room.")
         await player.send_event(CreateServerEvent(False, None, None).to_dict())
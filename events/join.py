@@ -1,10 +1,21 @@
-import logging
 from typing import Optional, List, Dict
 
 from card import CardManager
+from events.schema import ClientEvent
 from game import GameManager, GameState
+from log import get_logger
 from player import Player
 
+log = get_logger("join")
+
+
+class JoinClientEvent(ClientEvent):
+    __slots__ = ("game_id",)
+    TYPE = "join"
+    FIELDS = (("gameId", "game_id", int),)
+
+    game_id: int
+
 
 class JoinServerEvent:
     def __init__(self,
@@ -36,44 +47,39 @@ class JoinServerEvent:
         }
 
 
-async def join_event_handler(event: Dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('join') Handling event.")
+async def join_event_handler(event: JoinClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
 
     if player.game_id is None:
-        if "gameId" not in event:
-            logging.info(f"[{player.name}]: ('join') Missing values. Skipping.")
-            return
-
-        game_id = event["gameId"]
+        game_id = event.game_id
 
         game = game_mgr.get_game(game_id)
 
         if game is not None:
             if game.game_state == GameState.WAITING and not game.is_full():
-                game.join(player)
+                game_mgr.join_game(game, player)
                 player.game_id = game_id
 
-                for game_player in game.players:
-                    await game_player.send_event(
-                        JoinServerEvent(
-                            True,
-                            player.name,
-                            game.game_id,
-                            game.game_name,
-                            game.host.name,
-                            [game_player.name for game_player in game.players],
-                            game.is_can_play()
-                        ).to_dict()
-                    )
+                await game.broadcast(
+                    JoinServerEvent(
+                        True,
+                        player.name,
+                        game.game_id,
+                        game.game_name,
+                        game.host.name,
+                        [game_player.name for game_player in game.players],
+                        game.is_can_play()
+                    ).to_dict()
+                )
 
-                logging.info(f"{player}: ('join') Joined {game}.")
+                log.info(player, "Joined %s.", game)
             else:
-                logging.info(f"{player}: ('join') Room in play or full.")
+                log.info(player, "Room in play or full.")
         else:
-            logging.info(f"{player}: ('join') Invalid room {game_id}.")
+            log.info(player, "Invalid room %s.", game_id)
             await player.send_event(
                 JoinServerEvent(False).to_dict())
     else:
-        logging.info(f"{player}: ('join') Already in a room.")
+        log.info(player, "Already in a room.")
         await player.send_event(
             JoinServerEvent(False).to_dict())
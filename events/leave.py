@@ -1,10 +1,18 @@
-import logging
 from typing import Optional, Dict, List
 
 from card import CardManager
-from game import GameManager, GameState
+from events.schema import ClientEvent
+from game import Game, GameManager, GameState
+from log import get_logger
 from player import Player
 
+log = get_logger("leave")
+
+
+class LeaveClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "leave"
+
 
 class LeaveServerEvent:
     def __init__(self,
@@ -36,52 +44,58 @@ class LeaveServerEvent:
         }
 
 
-async def leave_event_handler(event: Dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('leave') Handling event.")
+async def close_game(game: Game, game_mgr: GameManager) -> None:
+    # every remaining player is kicked out with their own leave result
+    kicked_players = list(game.players)
+    for game_player in kicked_players:
+        game_mgr.leave_game(game, game_player)
+        game_player.game_id = None
+    for game_player in kicked_players:
+        await game_player.send_event(LeaveServerEvent(True, game_player.name).to_dict())
+
+    game_mgr.remove_game(game.game_id)
+
+
+async def leave_event_handler(event: LeaveClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
 
     if player.game_id is None:
-        logging.info(f"{player}: ('leave') Not in a room.")
+        log.info(player, "Not in a room.")
         await player.send_event(LeaveServerEvent(False).to_dict())
     else:
         game = game_mgr.get_game(player.game_id)
 
         if game is not None:
-            game.leave(player)
+            game_mgr.leave_game(game, player)
             player.game_id = None
 
-            logging.info(f"{player}: ('leave') Left {game}.")
+            log.info(player, "Left %s.", game)
 
             is_host_left_game_waiting = game.game_state == GameState.WAITING and game.host not in game.players
             is_not_enough_players_game_ongoing = game.game_state != GameState.WAITING and not game.is_can_play()
             is_game_closed = game.is_empty() or is_host_left_game_waiting or is_not_enough_players_game_ongoing
             if is_game_closed:
                 if game.is_empty():
-                    logging.info(f"{player}: ('leave') Closing {game} because empty")
+                    log.info(player, "Closing %s because empty", game)
                 elif is_host_left_game_waiting:
-                    logging.info(f"{player}: ('leave') Closing {game} because host left waiting game")
+                    log.info(player, "Closing %s because host left waiting game", game)
                 elif is_not_enough_players_game_ongoing:
-                    logging.info(f"{player}: ('leave') Closing {game} because not enough players ongoing game")
-
-            for game_player in game.players:
-                await game_player.send_event(
-                    LeaveServerEvent(
-                        True,
-                        player.name,
-                        game.game_id,
-                        game.game_name,
-                        game.host.name,
-                        [game_player.name for game_player in game.players],
-                        game.is_can_play()
-                    ).to_dict()
-                )
-
-                if is_game_closed:
-                    game.leave(game_player)
-                    game_player.game_id = None
-                    await game_player.send_event(LeaveServerEvent(True, game_player.name).to_dict())
+                    log.info(player, "Closing %s because not enough players ongoing game", game)
+
+            await game.broadcast(
+                LeaveServerEvent(
+                    True,
+                    player.name,
+                    game.game_id,
+                    game.game_name,
+                    game.host.name,
+                    [game_player.name for game_player in game.players],
+                    game.is_can_play()
+                ).to_dict()
+            )
 
             if is_game_closed:
-                game_mgr.remove_game(game.game_id)
+                await close_game(game, game_mgr)
 
             await player.send_event(LeaveServerEvent(True, player.name).to_dict())
         else:
@@ -0,0 +1,48 @@
+from typing import Dict
+
+from card import CardManager
+from events.schema import ClientEvent
+from game import GameManager
+from log import get_logger
+from player import Player
+
+subscribe_log = get_logger("subscribe_lobby")
+unsubscribe_log = get_logger("unsubscribe_lobby")
+
+
+class SubscribeLobbyClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "subscribe_lobby"
+
+
+class UnsubscribeLobbyClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "unsubscribe_lobby"
+
+
+class SubscribeLobbyServerEvent:
+    def __init__(self, result: bool, is_subscribed: bool):
+        self.result = result
+        self.is_subscribed = is_subscribed
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": "subscribe_lobby",
+            "result": self.result,
+            "isSubscribed": self.is_subscribed
+        }
+
+
+async def subscribe_lobby_event_handler(event: SubscribeLobbyClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    subscribe_log.info(player, "Handling event.")
+
+    # changes are pushed from now on, a search right after gives the starting point
+    game_mgr.lobby_feed.subscribe(player)
+    await player.send_event(SubscribeLobbyServerEvent(True, True).to_dict())
+
+
+async def unsubscribe_lobby_event_handler(event: UnsubscribeLobbyClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    unsubscribe_log.info(player, "Handling event.")
+
+    game_mgr.lobby_feed.unsubscribe(player)
+    await player.send_event(SubscribeLobbyServerEvent(True, False).to_dict())
@@ -1,43 +1,73 @@
-import logging
-from typing import Dict, Callable, Awaitable
+import time
+from typing import Dict, Callable, Type
 
 from card import CardManager
-from events.play.attack import attack_action_handler
-from events.play.counter import counter_action_handler
-from events.play.defend import defend_action_handler
-from events.play.skip import skip_action_handler
-from game import Game, GameManager, GameState
+from events.play.attack import attack_action, AttackActionPlayClientEvent
+from events.play.counter import counter_action, CounterActionPlayClientEvent
+from events.play.defend import defend_action, DefendActionPlayClientEvent
+from events.play.skip import skip_action, SkipActionPlayClientEvent
+from events.schema import ClientEvent
+from game import Game, GameManager, GameState, GameOutputs
+from log import get_logger
 from player import Player
+from tracing import current_trace
 
-action_handlers: Dict[str, Callable[[Dict, Player, Game, CardManager], Awaitable[None]]] = {
-    "attack": attack_action_handler,
-    "defend": defend_action_handler,
-    "counter": counter_action_handler,
-    "skip": skip_action_handler
+log = get_logger("play")
+
+# the rules of every play action, they change the game and return what to send without doing any I/O
+action_rules: Dict[Type[ClientEvent], Callable[[ClientEvent, Player, Game], GameOutputs]] = {
+    AttackActionPlayClientEvent: attack_action,
+    DefendActionPlayClientEvent: defend_action,
+    CounterActionPlayClientEvent: counter_action,
+    SkipActionPlayClientEvent: skip_action
 }
 
 
-async def play_event_handler(event: dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('play') Handling event.")
+def apply_action(event: ClientEvent, player: Player, game: Game) -> GameOutputs:
+    # synchronous, so games can also be played without sockets or an event loop
+    return action_rules[type(event)](event, player, game)
+
+
+async def play_event_handler(event: ClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
 
     if player.game_id is None:
-        logging.info(f"{player}: ('play') Not in a room. Skipping.")
+        log.info(player, "Not in a room. Skipping.")
     else:
         game = game_mgr.get_game(player.game_id)
 
         if game is not None:
-            if game.game_state is GameState.END:
-                logging.info(f"{player}: ('play') {game} has already ended. Skipping.")
-                return
-
-            if "action" not in event:
-                logging.info(f"{player}: ('play') Missing values. Skipping.")
-                return
-            action = event["action"]
-
-            if action in action_handlers:
-                await action_handlers[action](event, player, game, card_mgr)
-            else:
-                logging.info(f"{player}: ('play') Unknown action ~{action}~. Skipping.")
+            trace = current_trace.get()
+            if trace is not None:
+                lock_start = time.perf_counter()
+            async with game.action_lock:
+                if trace is not None:
+                    trace.add("lock", time.perf_counter() - lock_start)
+                # checked under the lock, an action queued behind the last one may find the game ended
+                if game.game_state is GameState.END:
+                    log.info(player, "%s has already ended. Skipping.", game)
+                    return
+
+                await game.send_outputs(apply_action(event, player, game))
         else:
-            logging.info(f"{player}: ('play') Player not in a valid room. Skipping.")
+            log.info(player, "Player not in a valid room. Skipping.")
+
+
+async def turn_timeout_handler(game: Game, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    # the player that has to act ran out of time and skips
+    turn = (game.game_state, game.player_turn_no)
+    async with game.action_lock:
+        if (game.game_state, game.player_turn_no) != turn or game_mgr.get_game(game.game_id) is not game:
+            # an action that was already queued moved the game on
+            return
+
+        if game.game_state is GameState.TURN:
+            player = game.players[game.player_turn_no]
+        elif game.game_state is GameState.COUNTER:
+            player = game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT]
+        else:
+            return
+
+        log.info(player, "Ran out of time in %s. Skipping.", game)
+        await game.send_outputs(skip_action(SkipActionPlayClientEvent(), player, game))
+        game_mgr.update_game(game)
@@ -1,10 +1,22 @@
-import logging
 from typing import Dict, Optional
 
-from card import Card, CardType, CardManager
-from game import GameState, Game
+from card import Card, CardType
+from events.schema import ClientEvent
+from game import GameState, Game, GameOutputs
+from log import get_logger
 from player import Player
 
+log = get_logger("play")
+
+
+class AttackActionPlayClientEvent(ClientEvent):
+    __slots__ = ("card_id",)
+    TYPE = "play"
+    ACTION = "attack"
+    FIELDS = (("cardId", "card_id", int),)
+
+    card_id: int
+
 
 class AttackActionPlayServerEvent:
     def __init__(self,
@@ -24,53 +36,44 @@ class AttackActionPlayServerEvent:
             "result": self.result,
             "playerAttack": self.player_attack,
             "playerTarget": self.player_target,
-            "card": {
-                "id": self.card.id,
-                "title": self.card.title,
-                "image": self.card.image,
-                "description": self.card.description,
-                "cardType": self.card.card_type.value,
-                "cardCategory": self.card.card_category.value,
-                "cardSubCategories": [card_sub_category.value for card_sub_category in self.card.card_sub_categories]
-            }
+            "card": None if self.card is None else self.card.wire
         }
 
 
-async def attack_action_handler(event: dict, player: Player, game: Game, card_mgr: CardManager) -> None:
+def attack_action(event: AttackActionPlayClientEvent, player: Player, game: Game) -> GameOutputs:
+    outputs: GameOutputs = []
     if game.players[game.player_turn_no] != player:
-        logging.info(f"{player}: ('play') ~attack~ Not player's turn. Skipping.")
-        await player.send_event(AttackActionPlayServerEvent(False).to_dict())
-        return
+        log.info(player, "~attack~ Not player's turn. Skipping.")
+        outputs.append((player, AttackActionPlayServerEvent(False)))
+        return outputs
 
     if game.game_state != GameState.TURN:
-        logging.info(f"{player}: ('play') ~attack~ Game state is not in turn mode. Skipping.")
-        await player.send_event(AttackActionPlayServerEvent(False).to_dict())
-        return
+        log.info(player, "~attack~ Game state is not in turn mode. Skipping.")
+        outputs.append((player, AttackActionPlayServerEvent(False)))
+        return outputs
 
-    if "cardId" not in event:
-        logging.info(f"{player}: ('play') ~attack~ Missing values. Skipping.")
-        await player.send_event(AttackActionPlayServerEvent(False).to_dict())
-        return
-    card_id = event["cardId"]
+    card_id = event.card_id
 
-    logging.info(f"{player}: ('play') ~attack~ Attacking.")
+    log.info(player, "~attack~ Attacking.")
     if card_id in game.players_hand[player]:
-        attack_card = card_mgr.cards[card_id]
+        attack_card = game.catalog.cards[card_id]
 
         # check attack card eligibility
         if attack_card.card_type != CardType.ATTACK:
-            logging.info(f"{player}: ('play') ~attack~ Card played not attack card. Skipping.")
-            return
+            log.info(player, "~attack~ Card played not attack card. Skipping.")
+            return outputs
 
         # update game state
         game.game_state = GameState.COUNTER
         game.discarded = attack_card
         game.players_hand[player].remove(card_id)
+        game.deck.discard(card_id)
 
         # update player client's
         player_target = game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT]
-        for game_player in game.players:
-            await game_player.send_event(AttackActionPlayServerEvent(True, player.name, player_target.name, attack_card).to_dict())
+        outputs.append((None, AttackActionPlayServerEvent(True, player.name, player_target.name, attack_card)))
     else:
-        logging.info(f"{player}: ('play') ~attack~ Card not in player hand. Skipping.")
-        await player.send_event(AttackActionPlayServerEvent(False).to_dict())
+        log.info(player, "~attack~ Card not in player hand. Skipping.")
+        outputs.append((player, AttackActionPlayServerEvent(False)))
+
+    return outputs
@@ -1,20 +1,32 @@
-import logging
-import random
+from array import array
 from typing import Dict, Optional
 
-from card import CardCategory, CardType, Card, CardManager
+from card import CardCategory, CardType, Card
 from events.play.draw import DrawActionPlayServerEvent
 from events.play.turn import TurnActionPlayServerEvent
-from game import Game, GameState
+from events.schema import ClientEvent
+from game import Game, GameState, scores_to_dict, GameOutputs
+from log import get_logger
 from player import Player
 
+log = get_logger("play")
+
+
+class CounterActionPlayClientEvent(ClientEvent):
+    __slots__ = ("card_id",)
+    TYPE = "play"
+    ACTION = "counter"
+    FIELDS = (("cardId", "card_id", int),)
+
+    card_id: int
+
 
 class CounterActionPlayEventResult:
     def __init__(self,
                  result: bool,
                  player_counter: Optional[str] = None,
                  card: Optional[Card] = None,
-                 players_scores: Optional[Dict[str, Dict[CardCategory, int]]] = None):
+                 players_scores: Optional[Dict[str, array]] = None):
         self.result = result
         self.player_counter = player_counter
         self.card = card
@@ -26,54 +38,41 @@ class CounterActionPlayEventResult:
             "action": "counter",
             "result": self.result,
             "playerCounter": self.player_counter,
-            "card": {
-                "id": self.card.id,
-                "title": self.card.title,
-                "image": self.card.image,
-                "description": self.card.description,
-                "cardType": self.card.card_type.value,
-                "cardCategory": self.card.card_category.value,
-                "cardSubCategories": [card_sub_category.value for card_sub_category in self.card.card_sub_categories]
-            },
-            "playersScores": {player: {
-                "red": scores[CardCategory.RED],
-                "blue": scores[CardCategory.BLUE],
-                "orange": scores[CardCategory.ORANGE]
-            } for player, scores in self.players_scores.items()}
+            "card": None if self.card is None else self.card.wire,
+            "playersScores": None if self.players_scores is None else {
+                player: scores_to_dict(scores) for player, scores in self.players_scores.items()
+            }
         }
 
 
-async def counter_action_handler(event: dict, player: Player, game: Game, card_mgr: CardManager) -> None:
+def counter_action(event: CounterActionPlayClientEvent, player: Player, game: Game) -> GameOutputs:
+    outputs: GameOutputs = []
     if game.game_state != GameState.COUNTER:
-        logging.info(f"{player}: ('play') ~counter~ Game state is not in counter mode. Skipping.")
-        await player.send_event(CounterActionPlayEventResult(False).to_dict())
-        return
+        log.info(player, "~counter~ Game state is not in counter mode. Skipping.")
+        outputs.append((player, CounterActionPlayEventResult(False)))
+        return outputs
 
     if game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT] != player:
-        logging.info(f"{player}: ('play') ~counter~ Player not target of the attack. Skipping.")
-        await player.send_event(CounterActionPlayEventResult(False).to_dict())
-        return
+        log.info(player, "~counter~ Player not target of the attack. Skipping.")
+        outputs.append((player, CounterActionPlayEventResult(False)))
+        return outputs
 
-    if "cardId" not in event:
-        logging.info(f"{player}: ('play') ~counter~ Missing values. Skipping.")
-        await player.send_event(CounterActionPlayEventResult(False).to_dict())
-        return
-    card_id = event["cardId"]
+    card_id = event.card_id
 
-    logging.info(f"{player}: ('play') ~counter~ Countering.")
+    log.info(player, "~counter~ Countering.")
     if card_id in game.players_hand[player]:
         # check defend card's eligibility
-        defend_card = card_mgr.cards[card_id]
+        defend_card = game.catalog.cards[card_id]
 
         if defend_card.card_type != CardType.DEFEND:
-            logging.info(f"{player}: ('play') ~counter~ Card played not defend card. Skipping.")
-            await player.send_event(CounterActionPlayEventResult(False).to_dict())
-            return
+            log.info(player, "~counter~ Card played not defend card. Skipping.")
+            outputs.append((player, CounterActionPlayEventResult(False)))
+            return outputs
 
         if defend_card.card_category is not CardCategory.WILD and defend_card.card_category is not game.discarded.card_category:
-            logging.info(f"{player}: ('play') ~counter~ Defend card does not match attack card's category. Skipping.")
-            await player.send_event(CounterActionPlayEventResult(False).to_dict())
-            return
+            log.info(player, "~counter~ Defend card does not match attack card's category. Skipping.")
+            outputs.append((player, CounterActionPlayEventResult(False)))
+            return outputs
 
         sub_categories_match = False
         for sub_category in defend_card.card_sub_categories:
@@ -81,36 +80,37 @@ async def counter_action_handler(event: dict, player: Player, game: Game, card_m
             if sub_categories_match:
                 break
         if not sub_categories_match:
-            logging.info(f"{player}: ('play') ~counter~ Defend card does not match attack card's sub categories. Skipping.")
-            await player.send_event(CounterActionPlayEventResult(False).to_dict())
-            return
+            log.info(player, "~counter~ Defend card does not match attack card's sub categories. Skipping.")
+            outputs.append((player, CounterActionPlayEventResult(False)))
+            return outputs
 
         # attacker draw card
         player_attack = game.players[game.player_turn_no]
 
-        draw_card_id = random.choice(card_mgr.deck_card_ids)
-        draw_card = card_mgr.cards[draw_card_id]
-        game.players_hand[player_attack].append(draw_card_id)
-        await player_attack.send_event(DrawActionPlayServerEvent(True, [draw_card]).to_dict())
-        logging.info(f"{player_attack}: ('play') ~counter~ Draw {draw_card}.")
+        draw_card_id = game.deck.draw()
+        draw_card = game.catalog.cards[draw_card_id]
+        game.players_hand[player_attack].add(draw_card_id)
 
         # update game state
         game.game_state = GameState.TURN
         game.discarded = defend_card
         game.players_hand[player].remove(card_id)
+        game.deck.discard(card_id)
         game.player_turn_no = (game.player_turn_no + 1) % game.PLAYER_LIMIT
 
         # update player clients
-        for game_player in game.players:
-            await game_player.send_event(
-                CounterActionPlayEventResult(
-                    True,
-                    player.name,
-                    defend_card,
-                    {game_player.name: scores for game_player, scores in game.players_scores.items()}
-                ).to_dict())
-            await game_player.send_event(TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name).to_dict())
+        outputs.append((player_attack, DrawActionPlayServerEvent(True, [draw_card])))
+        log.info(player_attack, "~counter~ Draw %s.", draw_card)
+        outputs.append((None, CounterActionPlayEventResult(
+            True,
+            player.name,
+            defend_card,
+            {game_player.name: scores for game_player, scores in game.players_scores.items()}
+        )))
+        outputs.append((None, TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name)))
 
     else:
-        logging.info(f"{player}: ('play') ~counter~ Card not in player hand. Skipping.")
-        await player.send_event(CounterActionPlayEventResult(False).to_dict())
+        log.info(player, "~counter~ Card not in player hand. Skipping.")
+        outputs.append((player, CounterActionPlayEventResult(False)))
+
+    return outputs
@@ -1,21 +1,33 @@
-import logging
-import random
+from array import array
 from typing import Dict, Optional
 
-from card import CardCategory, CardType, Card, CardManager
+from card import CardCategory, CardType, Card
 from events.play.draw import DrawActionPlayServerEvent
 from events.play.end import EndActionPlayServerEvent
 from events.play.turn import TurnActionPlayServerEvent
-from game import Game, GameState
+from events.schema import ClientEvent
+from game import Game, GameState, SCORE_INDEX, scores_to_dict, GameOutputs
+from log import get_logger
 from player import Player
 
+log = get_logger("play")
+
+
+class DefendActionPlayClientEvent(ClientEvent):
+    __slots__ = ("card_id",)
+    TYPE = "play"
+    ACTION = "defend"
+    FIELDS = (("cardId", "card_id", int),)
+
+    card_id: int
+
 
 class DefendActionPlayServerEvent:
     def __init__(self,
                  result: bool,
                  player_defend: Optional[str] = None,
                  card: Optional[Card] = None,
-                 players_scores: Optional[Dict[str, Dict[CardCategory, int]]] = None):
+                 players_scores: Optional[Dict[str, array]] = None):
         self.result = result
         self.player_defend = player_defend
         self.card = card
@@ -27,82 +39,69 @@ class DefendActionPlayServerEvent:
             "action": "defend",
             "result": self.result,
             "playerDefend": self.player_defend,
-            "card": {
-                "id": self.card.id,
-                "title": self.card.title,
-                "image": self.card.image,
-                "description": self.card.description,
-                "cardType": self.card.card_type.value,
-                "cardCategory": self.card.card_category.value,
-                "cardSubCategories": [card_sub_category.value for card_sub_category in self.card.card_sub_categories]
-            },
-            "playersScores": {player: {
-                "red": scores[CardCategory.RED],
-                "blue": scores[CardCategory.BLUE],
-                "orange": scores[CardCategory.ORANGE]
-            } for player, scores in self.players_scores.items()}
+            "card": None if self.card is None else self.card.wire,
+            "playersScores": None if self.players_scores is None else {
+                player: scores_to_dict(scores) for player, scores in self.players_scores.items()
+            }
         }
 
 
-async def defend_action_handler(event: dict, player: Player, game: Game, card_mgr: CardManager) -> None:
+def defend_action(event: DefendActionPlayClientEvent, player: Player, game: Game) -> GameOutputs:
+    outputs: GameOutputs = []
     if game.players[game.player_turn_no] != player:
-        logging.info(f"{player}: ('play') ~defend~ Not player's turn. Skipping.")
-        await player.send_event(DefendActionPlayServerEvent(False).to_dict())
-        return
+        log.info(player, "~defend~ Not player's turn. Skipping.")
+        outputs.append((player, DefendActionPlayServerEvent(False)))
+        return outputs
 
     if game.game_state != GameState.TURN:
-        logging.info(f"{player}: ('play') ~defend~ Game state is not in turn mode. Skipping.")
-        await player.send_event(DefendActionPlayServerEvent(False).to_dict())
-        return
+        log.info(player, "~defend~ Game state is not in turn mode. Skipping.")
+        outputs.append((player, DefendActionPlayServerEvent(False)))
+        return outputs
 
-    if "cardId" not in event:
-        logging.info(f"{player}: ('play') ~defend~ Missing values. Skipping.")
-        await player.send_event(DefendActionPlayServerEvent(False).to_dict())
-        return
-    card_id = event["cardId"]
+    card_id = event.card_id
 
-    logging.info(f"{player}: ('play') ~defend~ Defending.")
+    log.info(player, "~defend~ Defending.")
     if card_id in game.players_hand[player]:
-        defend_card = card_mgr.cards[card_id]
+        defend_card = game.catalog.cards[card_id]
 
         if defend_card.card_type != CardType.DEFEND:
-            logging.info(f"{player}: ('play') ~defend~ Card played not defend card. Skipping.")
-            return
+            log.info(player, "~defend~ Card played not defend card. Skipping.")
+            return outputs
         if defend_card.card_category == CardCategory.WILD:
-            logging.info(f"{player}: ('play') ~defend~ Card type is wild. Skipping.")
-            return
+            log.info(player, "~defend~ Card type is wild. Skipping.")
+            return outputs
 
         # update game state
         game.discarded = defend_card
         game.players_hand[player].remove(card_id)
+        game.deck.discard(card_id)
         game.player_turn_no = (game.player_turn_no + 1) % game.PLAYER_LIMIT
-        game.players_scores[player][defend_card.card_category] += 1
+        game.players_scores[player][SCORE_INDEX[defend_card.card_category]] += 1
         player_winner = game.get_winner()
         game.game_state = GameState.TURN if player_winner is None else GameState.END
 
         # defender draw card
         if player_winner is None:
-            draw_card_id = random.choice(card_mgr.deck_card_ids)
-            draw_card = card_mgr.cards[draw_card_id]
-            game.players_hand[player].append(draw_card_id)
-            await player.send_event(DrawActionPlayServerEvent(True, [draw_card]).to_dict())
-            logging.info(f"{player}: ('play') ~defend~ Draw {draw_card}.")
+            draw_card_id = game.deck.draw()
+            draw_card = game.catalog.cards[draw_card_id]
+            game.players_hand[player].add(draw_card_id)
+            outputs.append((player, DrawActionPlayServerEvent(True, [draw_card])))
+            log.info(player, "~defend~ Draw %s.", draw_card)
 
         # update player clients
-        for game_player in game.players:
-            await game_player.send_event(
-                DefendActionPlayServerEvent(
-                    True,
-                    player.name,
-                    defend_card, {game_player.name: scores for game_player, scores in game.players_scores.items()}
-                ).to_dict()
-            )
-
-            if player_winner is None:
-                await game_player.send_event(TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name).to_dict())
-            else:
-                await game_player.send_event(EndActionPlayServerEvent(True, player_winner.name).to_dict())
+        outputs.append((None, DefendActionPlayServerEvent(
+            True,
+            player.name,
+            defend_card, {game_player.name: scores for game_player, scores in game.players_scores.items()}
+        )))
+
+        if player_winner is None:
+            outputs.append((None, TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name)))
+        else:
+            outputs.append((None, EndActionPlayServerEvent(True, player_winner.name)))
 
     else:
-        logging.info(f"{player}: ('play') ~defend~ Card not in player hand. Skipping.")
-        await player.send_event(DefendActionPlayServerEvent(False).to_dict())
+        log.info(player, "~defend~ Card not in player hand. Skipping.")
+        outputs.append((player, DefendActionPlayServerEvent(False)))
+
+    return outputs
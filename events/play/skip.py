@@ -1,20 +1,28 @@
-import logging
-import random
+from array import array
 from typing import Dict, Optional
 
-from card import CardCategory, CardManager
 from events.play.draw import DrawActionPlayServerEvent
 from events.play.end import EndActionPlayServerEvent
 from events.play.turn import TurnActionPlayServerEvent
-from game import GameState, Game
+from events.schema import ClientEvent
+from game import GameState, Game, SCORE_INDEX, scores_to_dict, GameOutputs
+from log import get_logger
 from player import Player
 
+log = get_logger("play")
+
+
+class SkipActionPlayClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "play"
+    ACTION = "skip"
+
 
 class SkipActionPlayServerEvent:
     def __init__(self,
                  result: bool,
                  player_skip: Optional[str] = None,
-                 players_scores: Optional[Dict[str, Dict[CardCategory, int]]] = None):
+                 players_scores: Optional[Dict[str, array]] = None):
         self.result = result
         self.player_skip = player_skip
         self.players_scores = players_scores
@@ -25,58 +33,60 @@ class SkipActionPlayServerEvent:
             "action": "skip",
             "result": self.result,
             "playerSkip": self.player_skip,
-            "playersScores": {player: {
-                "red": scores[CardCategory.RED],
-                "blue": scores[CardCategory.BLUE],
-                "orange": scores[CardCategory.ORANGE]
-            } for player, scores in self.players_scores.items()}
+            "playersScores": None if self.players_scores is None else {
+                player: scores_to_dict(scores) for player, scores in self.players_scores.items()
+            }
         }
 
 
-async def skip_action_handler(event: dict, player: Player, game: Game, card_mgr: CardManager) -> None:
+def skip_action(event: SkipActionPlayClientEvent, player: Player, game: Game) -> GameOutputs:
+    outputs: GameOutputs = []
     if game.game_state not in [GameState.TURN, GameState.COUNTER]:
-        logging.info(f"{player}: ('play') ~skip~ Game state is not in turn or counter mode. Skipping.")
-        await player.send_event(SkipActionPlayServerEvent(False).to_dict())
-        return
+        log.info(player, "~skip~ Game state is not in turn or counter mode. Skipping.")
+        outputs.append((player, SkipActionPlayServerEvent(False)))
+        return outputs
 
     if game.game_state is GameState.TURN:
-        logging.info(f"{player}: ('play') ~skip~ Skipping turn.")
+        log.info(player, "~skip~ Skipping turn.")
+
+        if game.players[game.player_turn_no] != player:
+            log.info(player, "~skip~ Not player's turn. Skipping.")
+            outputs.append((player, SkipActionPlayServerEvent(False)))
+            return outputs
 
         # update game state
         game.game_state = GameState.TURN
         game.player_turn_no = (game.player_turn_no + 1) % game.PLAYER_LIMIT
 
         # player draw card
-        draw_card_id = random.choice(card_mgr.deck_card_ids)
-        draw_card = card_mgr.cards[draw_card_id]
-        game.players_hand[player].append(draw_card_id)
-        await player.send_event(DrawActionPlayServerEvent(True, [draw_card]).to_dict())
-        logging.info(f"{player}: ('play') ~skip~ Draw {draw_card}.")
+        draw_card_id = game.deck.draw()
+        draw_card = game.catalog.cards[draw_card_id]
+        game.players_hand[player].add(draw_card_id)
+        outputs.append((player, DrawActionPlayServerEvent(True, [draw_card])))
+        log.info(player, "~skip~ Draw %s.", draw_card)
 
         # update player clients
-        for game_player in game.players:
-            await game_player.send_event(
-                SkipActionPlayServerEvent(
-                    True,
-                    player.name,
-                    {game_player.name: scores for game_player, scores in game.players_scores.items()}
-                ).to_dict()
-            )
-            await game_player.send_event(TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name).to_dict())
+        outputs.append((None, SkipActionPlayServerEvent(
+            True,
+            player.name,
+            {game_player.name: scores for game_player, scores in game.players_scores.items()}
+        )))
+        outputs.append((None, TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name)))
 
     elif game.game_state is GameState.COUNTER:
-        logging.info(f"{player}: ('play') ~skip~ Skipping counter.")
+        log.info(player, "~skip~ Skipping counter.")
 
         if game.players[(game.player_turn_no + 1) % game.PLAYER_LIMIT].name != player.name:
-            logging.info(f"{player}: ('play') ~skip~ Player not target of the attack. Skipping.")
-            await player.send_event(SkipActionPlayServerEvent(False).to_dict())
-            return
+            log.info(player, "~skip~ Player not target of the attack. Skipping.")
+            outputs.append((player, SkipActionPlayServerEvent(False)))
+            return outputs
 
         player_attack = game.players[game.player_turn_no]
 
         # update scores
-        game.players_scores[player_attack][game.discarded.card_category] += 1
-        game.players_scores[player][game.discarded.card_category] -= 1
+        score_index = SCORE_INDEX[game.discarded.card_category]
+        game.players_scores[player_attack][score_index] += 1
+        game.players_scores[player][score_index] -= 1
 
         # update game state
         game.player_turn_no = (game.player_turn_no + 1) % game.PLAYER_LIMIT
@@ -85,23 +95,22 @@ async def skip_action_handler(event: dict, player: Player, game: Game, card_mgr:
 
         # player attack draw card
         if player_winner is None:
-            draw_card_id = random.choice(card_mgr.deck_card_ids)
-            draw_card = card_mgr.cards[draw_card_id]
-            game.players_hand[player_attack].append(draw_card_id)
-            await player_attack.send_event(DrawActionPlayServerEvent(True, [draw_card]).to_dict())
-            logging.info(f"{player_attack}: ('play') ~skip~ Draw {draw_card}.")
+            draw_card_id = game.deck.draw()
+            draw_card = game.catalog.cards[draw_card_id]
+            game.players_hand[player_attack].add(draw_card_id)
+            outputs.append((player_attack, DrawActionPlayServerEvent(True, [draw_card])))
+            log.info(player_attack, "~skip~ Draw %s.", draw_card)
 
         # update player client's
-        for game_player in game.players:
-            await game_player.send_event(
-                SkipActionPlayServerEvent(
-                    True,
-                    player.name,
-                    {player.name: scores for player, scores in game.players_scores.items()}
-                ).to_dict()
-            )
-
-            if player_winner is None:
-                await game_player.send_event(TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name).to_dict())
-            else:
-                await game_player.send_event(EndActionPlayServerEvent(True, player_winner.name).to_dict())
+        outputs.append((None, SkipActionPlayServerEvent(
+            True,
+            player.name,
+            {game_player.name: scores for game_player, scores in game.players_scores.items()}
+        )))
+
+        if player_winner is None:
+            outputs.append((None, TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name)))
+        else:
+            outputs.append((None, EndActionPlayServerEvent(True, player_winner.name)))
+
+    return outputs
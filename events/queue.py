@@ -0,0 +1,72 @@
+from typing import Dict
+
+from card import CardManager
+from events.join import JoinServerEvent
+from events.schema import ClientEvent
+from events.start import start_game
+from game import GameManager
+from log import get_logger
+from player import Player
+
+log = get_logger("queue")
+leave_log = get_logger("leave_queue")
+
+
+class QueueClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "queue"
+
+
+class LeaveQueueClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "leave_queue"
+
+
+class QueueServerEvent:
+    def __init__(self, result: bool, is_queued: bool):
+        self.result = result
+        self.is_queued = is_queued
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": "queue",
+            "result": self.result,
+            "isQueued": self.is_queued
+        }
+
+
+async def queue_event_handler(event: QueueClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
+
+    if player.game_id is not None:
+        log.info(player, "Already in a room.")
+        await player.send_event(QueueServerEvent(False, False).to_dict())
+        return
+
+    await player.send_event(QueueServerEvent(True, True).to_dict())
+
+    game = game_mgr.queue_player(player)
+    if game is None:
+        log.info(player, "Waiting for a match.")
+        return
+
+    # matched players get the same events as if they joined and the host started the game
+    await game.broadcast(
+        JoinServerEvent(
+            True,
+            player.name,
+            game.game_id,
+            game.game_name,
+            game.host.name,
+            [game_player.name for game_player in game.players],
+            game.is_can_play()
+        ).to_dict()
+    )
+    await start_game(game, game_mgr, card_mgr)
+
+
+async def leave_queue_event_handler(event: LeaveQueueClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    leave_log.info(player, "Handling event.")
+
+    is_cancelled = game_mgr.matchmaker.cancel(player)
+    await player.send_event(QueueServerEvent(is_cancelled, False).to_dict())
@@ -0,0 +1,33 @@
+from typing import Dict, Optional
+
+from events.join import JoinClientEvent
+from events.queue import QueueClientEvent
+from events.schema import ClientEvent
+
+# every codec writes compact json in key order, so the front can spot a redirect without decoding every frame
+REDIRECT_FRAME_PREFIX = '{"type":"redirect"'
+
+# matchmaking needs every queued player in one place
+MATCHMAKING_SHARD = 0
+
+
+class RedirectServerEvent:
+    def __init__(self, shard: int):
+        self.shard = shard
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": "redirect",
+            "shard": self.shard
+        }
+
+
+def route_shard(event: ClientEvent, shard_count: int) -> Optional[int]:
+    # shard that has to handle the event, None when any shard can
+    if shard_count <= 1:
+        return None
+    if isinstance(event, JoinClientEvent):
+        return event.game_id % shard_count
+    if isinstance(event, QueueClientEvent):
+        return MATCHMAKING_SHARD
+    return None
@@ -0,0 +1,90 @@
+from typing import Dict, Optional, Tuple, Type, Union, Iterable, Any
+
+import codec
+from tracing import current_trace
+
+MAX_EVENT_SIZE = 4096
+MAX_STRING_LENGTH = 64
+
+
+class EventSchemaError(ValueError):
+    pass
+
+
+class ClientEvent:
+    __slots__ = ()
+
+    TYPE: str = ""
+    ACTION: Optional[str] = None
+    # (wire name, attribute name, type) of every required field
+    FIELDS: Tuple[Tuple[str, str, type], ...] = ()
+    # (wire name, attribute name, type, default) of every optional field, a null value means the default
+    OPTIONAL_FIELDS: Tuple[Tuple[str, str, type, Any], ...] = ()
+
+    def __init__(self, *values: Any) -> None:
+        for (_, attr_name, _), value in zip(self.FIELDS, values):
+            setattr(self, attr_name, value)
+        optional_values = values[len(self.FIELDS):]
+        for index, (_, attr_name, _, default) in enumerate(self.OPTIONAL_FIELDS):
+            setattr(self, attr_name, optional_values[index] if index < len(optional_values) else default)
+
+    @classmethod
+    def from_dict(cls, raw: Dict) -> "ClientEvent":
+        values = []
+        for wire_name, attr_name, field_type in cls.FIELDS:
+            values.append(check_field(wire_name, raw.get(wire_name), field_type))
+        for wire_name, attr_name, field_type, default in cls.OPTIONAL_FIELDS:
+            value = raw.get(wire_name)
+            values.append(default if value is None else check_field(wire_name, value, field_type))
+        return cls(*values)
+
+    def __repr__(self) -> str:
+        attr_names = [attr_name for _, attr_name, _ in self.FIELDS] + [attr_name for _, attr_name, _, _ in self.OPTIONAL_FIELDS]
+        fields = ", ".join([f"{attr_name}={getattr(self, attr_name)!r}" for attr_name in attr_names])
+        return f"{type(self).__name__}({fields})"
+
+
+def check_field(wire_name: str, value: Any, field_type: type) -> Any:
+    # exact type check, so that bools do not pass as ints
+    if type(value) is not field_type:
+        raise EventSchemaError(f"'{wire_name}' must be {field_type.__name__}")
+    if field_type is str and len(value) > MAX_STRING_LENGTH:
+        raise EventSchemaError(f"'{wire_name}' is longer than {MAX_STRING_LENGTH}")
+    return value
+
+
+class EventDecoder:
+    def __init__(self, event_classes: Iterable[Type[ClientEvent]]) -> None:
+        self.event_classes: Dict[Tuple[str, Optional[str]], Type[ClientEvent]] = {}
+        self.action_types = set()
+        for event_class in event_classes:
+            self.event_classes[(event_class.TYPE, event_class.ACTION)] = event_class
+            if event_class.ACTION is not None:
+                self.action_types.add(event_class.TYPE)
+
+    def decode(self, data: Union[str, bytes]) -> ClientEvent:
+        # the limit is in bytes, a str frame is only encoded when its characters could take more than that
+        size = len(data) if isinstance(data, bytes) or len(data) * 4 <= MAX_EVENT_SIZE else len(data.encode("utf-8"))
+        if size > MAX_EVENT_SIZE:
+            raise EventSchemaError(f"Event is larger than {MAX_EVENT_SIZE} bytes")
+
+        raw = codec.decode(data)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.mark("decode")
+        if not isinstance(raw, dict):
+            raise EventSchemaError("Event is not an object")
+
+        event_type = raw.get("type")
+        event_action = raw.get("action") if event_type in self.action_types else None
+        if type(event_type) is not str or (event_action is not None and type(event_action) is not str):
+            raise EventSchemaError("Missing event type")
+
+        event_class = self.event_classes.get((event_type, event_action))
+        if event_class is None:
+            raise EventSchemaError(f"Unknown event '{event_type}'" if event_action is None else f"Unknown action '{event_type}' ~{event_action}~")
+
+        event = event_class.from_dict(raw)
+        if trace is not None:
+            trace.mark("validate")
+        return event
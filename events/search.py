@@ -1,11 +1,36 @@
-import logging
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from card import CardManager
+from events.schema import ClientEvent
 from game import GameManager
+from lobby import LobbyIndex
+from log import get_logger
 from player import Player
 
+log = get_logger("search")
+
+SEARCH_PAGE_LIMIT = 20
+SEARCH_PAGE_MAX_LIMIT = 100
+
+
+class SearchClientEvent(ClientEvent):
+    __slots__ = ("name_prefix", "player_count", "is_only_open", "cursor", "limit")
+    TYPE = "search"
+    OPTIONAL_FIELDS = (
+        ("namePrefix", "name_prefix", str, None),
+        ("playerCount", "player_count", int, None),
+        ("onlyOpen", "is_only_open", bool, False),
+        ("cursor", "cursor", str, None),
+        ("limit", "limit", int, SEARCH_PAGE_LIMIT),
+    )
+
+    name_prefix: Optional[str]
+    player_count: Optional[int]
+    is_only_open: bool
+    cursor: Optional[str]
+    limit: int
+
 
 @dataclass
 class GameSearchItem:
@@ -16,9 +41,10 @@ class GameSearchItem:
 
 
 class SearchServerEvent:
-    def __init__(self, result: bool, games: List[GameSearchItem]):
+    def __init__(self, result: bool, games: List[GameSearchItem], next_cursor: Optional[str] = None):
         self.result = result
         self.games = games
+        self.next_cursor = next_cursor
 
     def to_dict(self) -> Dict:
         return {
@@ -29,16 +55,29 @@ class SearchServerEvent:
                 "gameName": game.game_name,
                 "playerCount": game.player_count,
                 "isFull": game.is_full
-            } for game in self.games]
+            } for game in self.games],
+            "nextCursor": self.next_cursor
         }
 
 
-async def search_event_handler(event: Dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('search') Handling event.")
-
-    await player.send_event(
-        SearchServerEvent(
-            True,
-            [GameSearchItem(game.game_id, game.game_name, len(game.players), game.is_full()) for game in game_mgr.games.values()]
-        ).to_dict()
+def search_lobby(event: SearchClientEvent, lobby: LobbyIndex) -> SearchServerEvent:
+    limit = max(1, min(event.limit, SEARCH_PAGE_MAX_LIMIT))
+    entries, next_cursor = lobby.search(event.name_prefix, event.player_count, event.is_only_open, event.cursor, limit)
+    return SearchServerEvent(
+        True,
+        [GameSearchItem(entry.game_id, entry.game_name, entry.player_count, entry.is_full) for entry in entries],
+        next_cursor
     )
+
+
+async def search_event_handler(event: SearchClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
+
+    try:
+        search_event = search_lobby(event, game_mgr.lobby)
+    except ValueError:
+        log.info(player, "Invalid cursor. Skipping.")
+        await player.send_event(SearchServerEvent(False, []).to_dict())
+        return
+
+    await player.send_event(search_event.to_dict())
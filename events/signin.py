@@ -1,12 +1,55 @@
-from typing import Dict
+from typing import Dict, Optional
+
+from events.schema import ClientEvent
+from game import Game, GameState, scores_to_dict
+from player import Player
+
+
+class SignInClientEvent(ClientEvent):
+    __slots__ = ("player_name", "session_token")
+    TYPE = "signin"
+    FIELDS = (("playerName", "player_name", str),)
+    OPTIONAL_FIELDS = (("sessionToken", "session_token", str, None),)
+
+    player_name: str
+    session_token: Optional[str]
 
 
 class SignInEvent:
-    def __init__(self, result: bool):
+    def __init__(self, result: bool, session_token: Optional[str] = None, is_resumed: bool = False):
         self.result = result
+        self.session_token = session_token
+        self.is_resumed = is_resumed
 
     def to_dict(self) -> Dict:
         return {
             "type": "signin",
-            "result": self.result
+            "result": self.result,
+            "sessionToken": self.session_token,
+            "isResumed": self.is_resumed
+        }
+
+
+class ResumeServerEvent:
+    # everything a resumed player needs to redraw the game, events sent while it was away are not replayed
+    def __init__(self, game: Game, player: Player):
+        self.game = game
+        self.player = player
+
+    def to_dict(self) -> Dict:
+        game = self.game
+        is_in_progress = game.game_state != GameState.WAITING
+        return {
+            "type": "resume",
+            "result": True,
+            "gameId": game.game_id,
+            "gameName": game.game_name,
+            "host": game.host.name,
+            "players": [game_player.name for game_player in game.players],
+            "isCanStart": game.is_can_play(),
+            "gameState": game.game_state.name.lower(),
+            "playerTurn": game.players[game.player_turn_no].name if is_in_progress else None,
+            "cards": [game.catalog.cards[card_id].wire for card_id in game.players_hand[self.player]] if is_in_progress else [],
+            "scores": {game_player.name: scores_to_dict(scores) for game_player, scores in game.players_scores.items()},
+            "discarded": None if game.discarded is None else game.discarded.wire
         }
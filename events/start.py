@@ -1,13 +1,23 @@
-import logging
-import random
 from typing import Dict
 
-from card import CardManager
+from card import CardManager, CardCatalog
+from deck import Deck
+from hand import Hand
+from events.schema import ClientEvent
 from events.play.draw import DrawActionPlayServerEvent
 from events.play.turn import TurnActionPlayServerEvent
-from game import GameState, GameManager
+from game import Game, GameManager, GameState, GameOutputs
+from log import get_logger
 from player import Player
 
+log = get_logger("start")
+manager_log = get_logger("game_manager", is_tagged=False)
+
+
+class StartClientEvent(ClientEvent):
+    __slots__ = ()
+    TYPE = "start"
+
 
 class StartServerEvent:
     def __init__(self, result: bool):
@@ -20,32 +30,48 @@ class StartServerEvent:
         }
 
 
-async def start_event_handler(event: Dict, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
-    logging.info(f"{player}: ('start') Handling event.")
+def deal_game(game: Game, catalog: CardCatalog) -> GameOutputs:
+    # the game keeps the cards it started with, even if they are reloaded mid game
+    game.game_state = GameState.TURN
+    game.catalog = catalog
+    game.deck = Deck(game.catalog.deck_card_ids, game.seed)
+
+    outputs: GameOutputs = [(None, StartServerEvent(True))]
+    for game_player in game.players:
+        drawn_card_ids = game.deck.draw_many(5)
+        game.players_hand[game_player] = Hand(drawn_card_ids)
+
+        # each hand is private
+        drawn_cards = [game.catalog.cards[drawn_card_id] for drawn_card_id in drawn_card_ids]
+        log.info(game_player, "Draw %s.", ', '.join([str(c) for c in drawn_cards]))
+        outputs.append((game_player, DrawActionPlayServerEvent(True, drawn_cards)))
+
+    outputs.append((None, TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name)))
+    return outputs
+
+
+async def start_game(game: Game, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    game_mgr.start_game(game)
+    outputs = deal_game(game, card_mgr.catalog)
+    manager_log.info("[Game Manager]", "Starting %s with %s and seed %s.", game, game.catalog, game.seed)
+    await game.send_outputs(outputs)
+
+
+async def start_event_handler(event: StartClientEvent, player: Player, game_mgr: GameManager, card_mgr: CardManager) -> None:
+    log.info(player, "Handling event.")
 
     if player.game_id is None:
-        logging.info(f"{player}: ('start') Not in a room.")
+        log.info(player, "Not in a room.")
     else:
         game = game_mgr.get_game(player.game_id)
 
         if game is not None:
             if game.is_can_play():
                 if game.players[0] == player:
-                    game.game_state = GameState.TURN
-
-                    for game_player in game.players:
-                        drawn_card_ids = random.sample(card_mgr.deck_card_ids, k=5)
-                        game.players_hand[game_player] = drawn_card_ids
-
-                        drawn_cards = [card_mgr.cards[drawn_card_id] for drawn_card_id in drawn_card_ids]
-                        logging.info(f"{game_player}: ('start') Draw {', '.join([str(c) for c in drawn_cards])}.")
-
-                        await game_player.send_event(StartServerEvent(True).to_dict())
-                        await game_player.send_event(DrawActionPlayServerEvent(True, drawn_cards).to_dict())
-                        await game_player.send_event(TurnActionPlayServerEvent(True, game.players[game.player_turn_no].name).to_dict())
+                    await start_game(game, game_mgr, card_mgr)
                 else:
-                    logging.info(f"{player}: ('start') Player is not host of {game}. Skipping.")
+                    log.info(player, "Player is not host of %s. Skipping.", game)
             else:
-                logging.info(f"{player}: ('start') Cannot start {game}. Too little players.")
+                log.info(player, "Cannot start %s. Too little players.", game)
         else:
-            logging.info(f"{player}: ('start') Player not in a valid room.")
+            log.info(player, "Player not in a valid room.")
@@ -1,8 +1,23 @@
-import logging
+import asyncio
+import random
+import time
+from array import array
 from enum import Enum
-from typing import List, Dict, Optional
-from player import Player
-from card import Card, CardCategory
+from typing import Any, List, Dict, Optional, Tuple, Union
+from log import get_logger
+from player import Player, coalesce_key, encode_frame
+from card import Card, CardCategory, CardCatalog
+from deck import Deck
+from hand import Hand
+from lobby import LobbyIndex, LobbyFeed, LobbyChange, LobbyEntry
+from matchmaking import Matchmaker
+from reaper import GameReaper
+from timers import TurnTimers
+from snapshot import SnapshotWriter, SnapshotReader, SnapshotError
+from store import GameStore
+
+log = get_logger("game", is_tagged=False)
+manager_log = get_logger("game_manager", is_tagged=False)
 
 
 class GameState(Enum):
@@ -15,11 +30,31 @@ class GameState(Enum):
     END = 6
 
 
+# categories that are scored, in the order they are stored in a player's score array
+SCORE_CATEGORIES: Tuple[CardCategory, ...] = (CardCategory.RED, CardCategory.ORANGE, CardCategory.BLUE)
+SCORE_INDEX: Dict[CardCategory, int] = {category: index for index, category in enumerate(SCORE_CATEGORIES)}
+
+
+GAME_SNAPSHOT_VERSION = 3
+
+# (recipient, server event) pairs an action produces, a recipient of None is every player of the game
+GameOutputs = List[Tuple[Optional[Player], Any]]
+
+
+def scores_to_dict(scores: array) -> Dict[str, int]:
+    return {category.value: scores[index] for index, category in enumerate(SCORE_CATEGORIES)}
+
+
 class Game:
+    __slots__ = (
+        "game_id", "game_name", "game_state", "host", "players", "player_turn_no",
+        "players_scores", "players_hand", "discarded", "catalog", "seed", "deck", "last_activity", "action_lock"
+    )
+
     PLAYER_LIMIT = 2
     WIN_SCORE_PER_CATEGORY = 1
 
-    def __init__(self, game_id: int, game_name: str, host: Player) -> None:
+    def __init__(self, game_id: int, game_name: str, host: Player, seed: int) -> None:
         self.game_id = game_id
         self.game_name = game_name
         self.game_state = GameState.WAITING
@@ -28,37 +63,123 @@ class Game:
         self.players: List[Player] = []
         self.player_turn_no = 0
 
-        self.players_scores: Dict[Player, Dict[CardCategory, int]] = {}
+        self.players_scores: Dict[Player, array] = {}
 
-        self.players_hand: Dict[Player, List[int]] = {}
+        self.players_hand: Dict[Player, Hand] = {}
         self.discarded: Optional[Card] = None
+        self.catalog: Optional[CardCatalog] = None
+        self.seed = seed
+        self.deck: Optional[Deck] = None
+        self.last_activity = time.monotonic()
+        # play actions and turn timeouts are applied one at a time per game
+        self.action_lock = asyncio.Lock()
 
         self.join(host)
 
     def join(self, player: Player):
         assert self.game_state == GameState.WAITING and len(self.players) < self.PLAYER_LIMIT
         self.players.append(player)
-        self.players_hand[player] = []
-        self.players_scores[player] = {
-            CardCategory.RED: 0,
-            CardCategory.BLUE: 0,
-            CardCategory.ORANGE: 0,
-        }
-        logging.info(f"{self}: {player} added.")
+        self.players_hand[player] = Hand()
+        self.players_scores[player] = array("i", bytes(4 * len(SCORE_CATEGORIES)))
+        log.info(self, "%s added.", player)
 
     def leave(self, player: Player):
         self.players.remove(player)
         del self.players_hand[player]
         del self.players_scores[player]
-        logging.info(f"{self}: {player} removed.")
+        log.info(self, "%s removed.", player)
+
+    async def send_outputs(self, outputs: GameOutputs) -> None:
+        # outputs are only sent once the action has been applied, in the order they were produced
+        for recipient, server_event in outputs:
+            if recipient is None:
+                await self.broadcast(server_event.to_dict())
+            else:
+                await recipient.send_event(server_event.to_dict())
+
+    async def broadcast(self, event: Dict, overrides: Optional[Dict[Player, Dict]] = None) -> None:
+        # encode once and queue the same frame on every player, players with overrides get their own copy
+        frame: Optional[Union[bytes, str]] = None
+        key = coalesce_key(event)
+        for player in self.players:
+            if overrides is not None and player in overrides:
+                await player.send_event({**event, **overrides[player]})
+            else:
+                if frame is None:
+                    frame = encode_frame(event)
+                await player.send_frame(frame, key)
+
+    def snapshot(self) -> bytes:
+        writer = SnapshotWriter()
+        writer.pack("BiBBII", GAME_SNAPSHOT_VERSION, self.game_id, self.game_state.value, self.player_turn_no, self.seed,
+                    0 if self.catalog is None else self.catalog.version)
+        writer.pack_str(self.game_name)
+        writer.pack("i", -1 if self.discarded is None else self.discarded.id)
+
+        writer.pack("B", self.deck is not None)
+        if self.deck is not None:
+            stack, cursor, discard_pile = self.deck.snapshot()
+            writer.pack_bytes(stack)
+            writer.pack("I", cursor)
+            writer.pack_bytes(discard_pile)
+
+        writer.pack("BB", len(self.players), self.players.index(self.host) if self.host in self.players else 0)
+        for player in self.players:
+            writer.pack_str(player.name)
+            writer.pack_str(player.session_token or "")
+            writer.pack_bytes(self.players_scores[player].tobytes())
+            writer.pack_bytes(self.players_hand[player].snapshot())
+        return writer.getvalue()
+
+    @classmethod
+    def from_snapshot(cls, data: bytes, catalog: CardCatalog) -> "Game":
+        # players come back detached, they have no connection until they resume their session
+        reader = SnapshotReader(data)
+        version, game_id, game_state, player_turn_no, seed, catalog_version = reader.unpack("BiBBII")
+        if version not in (2, GAME_SNAPSHOT_VERSION):
+            raise SnapshotError(f"Unknown game snapshot version {version}")
+        if catalog_version != 0 and catalog_version != catalog.version:
+            log.info("[Game]", "Restoring game %s from catalog v%s with catalog v%s.", game_id, catalog_version, catalog.version)
+
+        game = cls.__new__(cls)
+        game.game_id = game_id
+        game.game_name = reader.unpack_str()
+        game.game_state = GameState(game_state)
+        game.player_turn_no = player_turn_no
+        game.seed = seed
+        game.catalog = None if catalog_version == 0 else catalog
+        discarded_id, = reader.unpack("i")
+        game.discarded = catalog.cards.get(discarded_id) if discarded_id >= 0 else None
+
+        game.deck = None
+        has_deck, = reader.unpack("B")
+        if has_deck:
+            stack = reader.unpack_bytes()
+            cursor, = reader.unpack("I")
+            game.deck = Deck.from_snapshot(catalog.deck_card_ids, seed, stack, cursor, reader.unpack_bytes())
+
+        game.players = []
+        game.players_scores = {}
+        game.players_hand = {}
+        player_count, host_index = reader.unpack("BB")
+        for _ in range(player_count):
+            player = Player(None, reader.unpack_str(), reader.unpack_str() or None)
+            player.game_id = game_id
+            player.is_closed = True
+            scores = array("i")
+            scores.frombytes(reader.unpack_bytes())
+            game.players.append(player)
+            game.players_scores[player] = scores
+            game.players_hand[player] = Hand.from_snapshot(reader.unpack_bytes(), "B" if version == 2 else Hand.TYPECODE)
+        game.host = game.players[host_index] if game.players else None
+        game.last_activity = time.monotonic()
+        game.action_lock = asyncio.Lock()
+        return game
 
     def get_winner(self) -> Optional[Player]:
         player_win = None
         for player, scores in self.players_scores.items():
-            is_red_win = scores[CardCategory.RED] >= self.WIN_SCORE_PER_CATEGORY
-            is_orange_win = scores[CardCategory.ORANGE] >= self.WIN_SCORE_PER_CATEGORY
-            is_blue_win = scores[CardCategory.BLUE] >= self.WIN_SCORE_PER_CATEGORY
-            if is_red_win and is_orange_win and is_blue_win:
+            if min(scores) >= self.WIN_SCORE_PER_CATEGORY:
                 player_win = player
         return player_win
 
@@ -74,31 +195,124 @@ class Game:
     def is_in_progress(self):
         return self.game_state != GameState.WAITING
 
+    def is_ended(self):
+        return self.game_state == GameState.END
+
     def __str__(self):
         return f"<{self.game_id} @ {self.game_name}>"
 
 
 class GameManager:
-    def __init__(self) -> None:
-        self.game_id_counter = 0
-        self.games: Dict[int, Game] = dict()
+    __slots__ = (
+        "game_id_counter", "game_id_step", "random", "games", "lobby", "lobby_feed", "matchmaker", "reaper", "turn_timers"
+    )
+
+    def __init__(self,
+                 seed: Optional[int] = None,
+                 lobby_feed_window: float = 0.25,
+                 shard_index: int = 0,
+                 shard_count: int = 1,
+                 store: Optional[GameStore] = None,
+                 reaper: Optional[GameReaper] = None,
+                 turn_timers: Optional[TurnTimers] = None) -> None:
+        # game ids are striped over the shards, so the owning shard is game_id % shard_count
+        self.game_id_counter = shard_index
+        self.game_id_step = shard_count
+        # every game gets its own deck seed from here, so a fixed seed replays the same draws
+        self.random = random.Random(seed)
+        self.games = GameStore() if store is None else store
+        self.lobby = LobbyIndex()
+        self.lobby_feed = LobbyFeed(lobby_feed_window)
+        self.matchmaker = Matchmaker(Game.PLAYER_LIMIT)
+        self.reaper = GameReaper() if reaper is None else reaper
+        self.turn_timers = TurnTimers({GameState.TURN: 60.0, GameState.COUNTER: 20.0}) if turn_timers is None else turn_timers
 
     def create_game(self, game_name: str, host: Player) -> Game:
-        new_game = Game(self.game_id_counter, game_name, host)
-        self.games[self.game_id_counter] = new_game
-        self.game_id_counter += 1
+        # a player in a room can not be matched anymore
+        self.matchmaker.cancel(host)
+        new_game = Game(self.game_id_counter, game_name, host, self.random.getrandbits(32))
+        self.games.put(new_game)
+        self.reaper.track(new_game)
+        self.game_id_counter += self.game_id_step
+        self.lobby.update(new_game)
+        self.lobby_feed.publish(LobbyChange.CREATED, LobbyEntry.from_game(new_game))
 
-        logging.info(f"[Game Manager]: {new_game} has been created.")
+        manager_log.info("[Game Manager]", "%s has been created.", new_game)
 
         return new_game
 
     def get_game(self, game_id: int) -> Optional[Game]:
-        if game_id in self.games:
-            return self.games[game_id]
-        else:
+        return self.games.get(game_id)
+
+    def touch_game(self, game_id: int) -> None:
+        # called after every event a player sent
+        game = self.games.get(game_id)
+        if game is not None:
+            game.last_activity = time.monotonic()
+            self.reaper.track(game)
+            self.update_game(game)
+
+    def update_game(self, game: Game) -> None:
+        # called after every change to the game, the store decides when the game is written
+        self.turn_timers.update(game)
+        self.games.mark_dirty(game.game_id)
+
+    def restore_games(self, catalog: CardCatalog) -> int:
+        restored_count = 0
+        for snapshot in self.games.load_snapshots(self.game_id_counter % self.game_id_step, self.game_id_step):
+            try:
+                game = Game.from_snapshot(snapshot, catalog)
+            except (SnapshotError, ValueError) as e:
+                manager_log.info("[Game Manager]", "Skipping unreadable snapshot: %r", e)
+                continue
+
+            self.games.restore(game)
+            self.reaper.track(game)
+            self.turn_timers.update(game)
+            self.lobby.update(game)
+            if game.game_id >= self.game_id_counter:
+                self.game_id_counter = game.game_id + self.game_id_step
+            restored_count += 1
+        return restored_count
+
+    def join_game(self, game: Game, player: Player) -> None:
+        self.matchmaker.cancel(player)
+        game.join(player)
+        self.lobby.update(game)
+        self.lobby_feed.publish(LobbyChange.UPDATED, LobbyEntry.from_game(game))
+
+    def leave_game(self, game: Game, player: Player) -> None:
+        game.leave(player)
+        self.lobby.update(game)
+        if not game.is_in_progress():
+            self.lobby_feed.publish(LobbyChange.UPDATED, LobbyEntry.from_game(game))
+
+    def start_game(self, game: Game) -> None:
+        game.game_state = GameState.TURN
+        self.lobby.update(game)
+        self.lobby_feed.publish(LobbyChange.REMOVED, LobbyEntry.from_game(game))
+
+    def queue_player(self, player: Player) -> Optional[Game]:
+        group = self.matchmaker.enqueue(player)
+        if group is None:
             return None
 
+        host = group[0]
+        new_game = self.create_game(" vs ".join([group_player.name for group_player in group]), host)
+        host.game_id = new_game.game_id
+        for group_player in group[1:]:
+            self.join_game(new_game, group_player)
+            group_player.game_id = new_game.game_id
+
+        manager_log.info("[Game Manager]", "Matched %s into %s.", ', '.join([str(group_player) for group_player in group]), new_game)
+        return new_game
+
     def remove_game(self, game_id: int) -> None:
-        del_game = self.games[game_id]
-        logging.info(f"[Game Manager]: {del_game} will be removed.")
-        del self.games[game_id]
+        del_game = self.games.get(game_id)
+        manager_log.info("[Game Manager]", "%s will be removed.", del_game)
+        self.games.delete(game_id)
+        self.reaper.forget(game_id)
+        self.turn_timers.cancel(game_id)
+        del_entry = self.lobby.remove(game_id)
+        if del_entry is not None:
+            self.lobby_feed.publish(LobbyChange.REMOVED, del_entry)
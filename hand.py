@@ -0,0 +1,51 @@
+from array import array
+from typing import Iterable, Iterator
+
+
+class Hand:
+    # multiset of card ids stored as one unsigned short count per card id
+    __slots__ = ("counts", "size")
+
+    # snapshots before version 3 of the game snapshot stored a byte per count
+    TYPECODE = "H"
+
+    def __init__(self, card_ids: Iterable[int] = ()) -> None:
+        self.counts = array(self.TYPECODE)
+        self.size = 0
+        for card_id in card_ids:
+            self.add(card_id)
+
+    def add(self, card_id: int) -> None:
+        if card_id < 0:
+            raise ValueError(f"Invalid card id {card_id}")
+        if card_id >= len(self.counts):
+            self.counts.extend([0] * (card_id + 1 - len(self.counts)))
+        self.counts[card_id] += 1
+        self.size += 1
+
+    def remove(self, card_id: int) -> None:
+        if card_id not in self:
+            raise ValueError(f"Card {card_id} not in hand")
+        self.counts[card_id] -= 1
+        self.size -= 1
+
+    def snapshot(self) -> bytes:
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_snapshot(cls, snapshot: bytes, typecode: str = TYPECODE) -> "Hand":
+        hand = cls()
+        hand.counts.extend(array(typecode, snapshot).tolist())
+        hand.size = sum(hand.counts)
+        return hand
+
+    def __contains__(self, card_id: int) -> bool:
+        return 0 <= card_id < len(self.counts) and self.counts[card_id] > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for card_id, count in enumerate(self.counts):
+            for _ in range(count):
+                yield card_id
+
+    def __len__(self) -> int:
+        return self.size
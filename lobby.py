@@ -0,0 +1,190 @@
+import asyncio
+from bisect import bisect_left, bisect_right, insort
+from enum import StrEnum
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from player import encode_frame
+
+if TYPE_CHECKING:
+    from game import Game
+    from player import Player
+
+
+class LobbyEntry:
+    __slots__ = ("game_id", "game_name", "name_key", "player_count", "is_full")
+
+    def __init__(self, game_id: int, game_name: str, player_count: int, is_full: bool) -> None:
+        self.game_id = game_id
+        self.game_name = game_name
+        self.name_key = game_name.casefold()
+        self.player_count = player_count
+        self.is_full = is_full
+
+    @classmethod
+    def from_game(cls, game: "Game") -> "LobbyEntry":
+        return cls(game.game_id, game.game_name, len(game.players), game.is_full())
+
+
+class LobbyIndex:
+    # secondary indexes over waiting games, every index is kept sorted so a page starts with a bisect
+    __slots__ = ("entries", "waiting_ids", "open_ids", "name_index", "player_count_index")
+
+    def __init__(self) -> None:
+        self.entries: Dict[int, LobbyEntry] = {}
+        self.waiting_ids: List[int] = []
+        self.open_ids: List[int] = []
+        self.name_index: List[Tuple[str, int]] = []
+        self.player_count_index: Dict[int, List[int]] = {}
+
+    def update(self, game: "Game") -> None:
+        if game.is_in_progress():
+            self.remove(game.game_id)
+        else:
+            self.put(LobbyEntry.from_game(game))
+
+    def put(self, entry: LobbyEntry) -> None:
+        game_id = entry.game_id
+        self.remove(game_id)
+
+        self.entries[game_id] = entry
+        insort(self.waiting_ids, game_id)
+        if not entry.is_full:
+            insort(self.open_ids, game_id)
+        insort(self.name_index, (entry.name_key, game_id))
+        insort(self.player_count_index.setdefault(entry.player_count, []), game_id)
+
+    def remove(self, game_id: int) -> Optional[LobbyEntry]:
+        entry = self.entries.pop(game_id, None)
+        if entry is None:
+            return None
+
+        remove_sorted(self.waiting_ids, game_id)
+        if not entry.is_full:
+            remove_sorted(self.open_ids, game_id)
+        remove_sorted(self.name_index, (entry.name_key, game_id))
+        count_ids = self.player_count_index[entry.player_count]
+        remove_sorted(count_ids, game_id)
+        if not count_ids:
+            del self.player_count_index[entry.player_count]
+        return entry
+
+    def search(self,
+               name_prefix: Optional[str],
+               player_count: Optional[int],
+               is_only_open: bool,
+               cursor: Optional[str],
+               limit: int) -> Tuple[List[LobbyEntry], Optional[str]]:
+        # scan the most selective index from the cursor, the remaining filters are checked per game
+        if name_prefix is not None:
+            name_prefix = name_prefix.casefold()
+            if cursor is not None:
+                cursor_id, _, cursor_name = cursor.partition(":")
+                start = bisect_right(self.name_index, (cursor_name, int(cursor_id)))
+            else:
+                start = bisect_left(self.name_index, (name_prefix, -1))
+            # names are sorted, so the first name without the prefix ends the range
+            candidates = take_while_prefixed(self.name_index, start, name_prefix)
+        else:
+            if player_count is not None:
+                ids = self.player_count_index.get(player_count, [])
+            elif is_only_open:
+                ids = self.open_ids
+            else:
+                ids = self.waiting_ids
+            start = 0 if cursor is None else bisect_right(ids, int(cursor))
+            candidates = (ids[index] for index in range(start, len(ids)))
+
+        page: List[LobbyEntry] = []
+        for game_id in candidates:
+            entry = self.entries[game_id]
+            if player_count is not None and entry.player_count != player_count:
+                continue
+            if is_only_open and entry.is_full:
+                continue
+            if len(page) == limit:
+                last = page[-1]
+                next_cursor = f"{last.game_id}:{last.name_key}" if name_prefix is not None else str(last.game_id)
+                return page, next_cursor
+            page.append(entry)
+
+        return page, None
+
+
+class LobbyChange(StrEnum):
+    CREATED = "created"
+    UPDATED = "updated"
+    REMOVED = "removed"
+
+
+class LobbyFeed:
+    # pushes lobby changes to subscribers, changes within one window are merged per game and sent as one frame
+    __slots__ = ("window", "subscribers", "pending", "flush_handle")
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.subscribers: Dict["Player", None] = {}
+        self.pending: Dict[int, Tuple[LobbyChange, LobbyEntry]] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def subscribe(self, player: "Player") -> None:
+        self.subscribers[player] = None
+
+    def unsubscribe(self, player: "Player") -> None:
+        self.subscribers.pop(player, None)
+
+    def publish(self, change: LobbyChange, entry: LobbyEntry) -> None:
+        if not self.subscribers:
+            return
+
+        previous = self.pending.get(entry.game_id)
+        if previous is not None and previous[0] == LobbyChange.CREATED:
+            if change == LobbyChange.REMOVED:
+                # nobody has seen this game yet
+                del self.pending[entry.game_id]
+                return
+            change = LobbyChange.CREATED
+        self.pending[entry.game_id] = (change, entry)
+
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self) -> None:
+        self.flush_handle = None
+        if not self.pending:
+            return
+
+        changes = []
+        for game_id, (change, entry) in self.pending.items():
+            if change == LobbyChange.REMOVED:
+                changes.append({"change": change.value, "gameId": game_id})
+            else:
+                changes.append({
+                    "change": change.value,
+                    "gameId": game_id,
+                    "gameName": entry.game_name,
+                    "playerCount": entry.player_count,
+                    "isFull": entry.is_full
+                })
+        self.pending = {}
+
+        frame = encode_frame({
+            "type": "lobby",
+            "result": True,
+            "changes": changes
+        })
+        for player in self.subscribers:
+            player.enqueue(frame)
+
+
+def take_while_prefixed(name_index: List[Tuple[str, int]], start: int, name_prefix: str):
+    for index in range(start, len(name_index)):
+        name_key, game_id = name_index[index]
+        if not name_key.startswith(name_prefix):
+            return
+        yield game_id
+
+
+def remove_sorted(items: List, item) -> None:
+    index = bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
@@ -0,0 +1,202 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# per message logs go through an EventLog, records that are sampled out or over the rate limit are never created,
+# the rest is formatted and written on a background thread so a slow stream never blocks the event loop
+
+DEFAULT_RATE_CATEGORY = "*"
+
+
+class EventLog:
+    # one per category, shared by every module logging under it
+    __slots__ = ("category", "tag", "logger", "sample_rate", "rate_limit", "tokens", "refilled_at", "suppressed_count", "sampler")
+
+    def __init__(self, category: str, is_tagged: bool = True) -> None:
+        self.category = category
+        # shown in text lines as "[subject]: ('tag') message"
+        self.tag = category if is_tagged else None
+        self.logger = logging.getLogger(f"cyberwar.{category}")
+        self.sample_rate = 1.0
+        self.rate_limit: Optional[float] = None
+        self.tokens = 0.0
+        self.refilled_at = 0.0
+        self.suppressed_count = 0
+        # not the module random, games seeded through GAME_SEED must not see log sampling
+        self.sampler = random.Random()
+
+    def configure(self, sample_rate: float, rate_limit: Optional[float]) -> None:
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.tokens = rate_limit or 0.0
+        self.refilled_at = time.monotonic()
+
+    def is_allowed(self, level: int) -> bool:
+        if not self.logger.isEnabledFor(level):
+            return False
+        if level >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and self.sampler.random() >= self.sample_rate:
+            return False
+        if self.rate_limit is None:
+            return True
+
+        now = time.monotonic()
+        self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled_at) * self.rate_limit)
+        self.refilled_at = now
+        if self.tokens < 1.0:
+            self.suppressed_count += 1
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def log(self, level: int, subject: Any, message: str, args: tuple, fields: Dict[str, Any], exc_info: bool = False) -> None:
+        if not self.is_allowed(level):
+            return
+        if self.suppressed_count:
+            fields["suppressed"] = self.suppressed_count
+            self.suppressed_count = 0
+        self.logger.log(level, message, *args, exc_info=exc_info, extra={
+            "category": self.category,
+            "subject": subject,
+            "tag": self.tag,
+            "fields": fields
+        })
+
+    def debug(self, subject: Any, message: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.DEBUG, subject, message, args, fields)
+
+    def info(self, subject: Any, message: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.INFO, subject, message, args, fields)
+
+    def warning(self, subject: Any, message: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.WARNING, subject, message, args, fields)
+
+    def exception(self, subject: Any, message: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.ERROR, subject, message, args, fields, exc_info=True)
+
+
+event_logs: Dict[str, EventLog] = {}
+# sampling and rate limits by category, applied to event logs created before and after setup_logging
+log_limits: Dict[str, Dict[str, float]] = {"sample": {}, "rate": {}}
+
+
+def get_logger(category: str, is_tagged: bool = True) -> EventLog:
+    event_log = event_logs.get(category)
+    if event_log is None:
+        event_log = event_logs[category] = EventLog(category, is_tagged)
+        configure_event_log(event_log)
+    return event_log
+
+
+def configure_event_log(event_log: EventLog) -> None:
+    sample_rates = log_limits["sample"]
+    rate_limits = log_limits["rate"]
+    event_log.configure(
+        sample_rates.get(event_log.category, sample_rates.get(DEFAULT_RATE_CATEGORY, 1.0)),
+        rate_limits.get(event_log.category, rate_limits.get(DEFAULT_RATE_CATEGORY))
+    )
+
+
+def parse_category_values(text: str) -> Dict[str, float]:
+    # "play=0.1,event=0.5", a bare value applies to every category
+    values = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        category, separator, value = item.rpartition("=")
+        values[category if separator else DEFAULT_RATE_CATEGORY] = float(value)
+    return values
+
+
+def describe_subject(record: logging.LogRecord) -> Optional[str]:
+    # records from plain loggers have no subject, event logs always do even when it is None
+    if not hasattr(record, "subject"):
+        return None
+    return str(record.subject)
+
+
+class TextFormatter(logging.Formatter):
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        subject = describe_subject(record)
+        if subject is not None:
+            tag = f"('{record.tag}') " if record.tag is not None else ""
+            record.message = f"{subject}: {tag}{record.message}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.message += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return super().formatMessage(record)
+
+
+class JsonFormatter(logging.Formatter):
+    # one object per line
+    def __init__(self, static_fields: Dict[str, Any]) -> None:
+        super().__init__()
+        self.static_fields = static_fields
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": record.created,
+            "level": record.levelname.lower(),
+            "category": getattr(record, "category", record.name),
+            **self.static_fields
+        }
+        subject = describe_subject(record)
+        if subject is not None:
+            line["subject"] = subject
+        line["message"] = record.getMessage()
+        line.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class LoopQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the queue never leaves the process, so the record is formatted by the listener thread instead of here
+        # arguments are players, games and cards, whose string forms do not change
+        return record
+
+
+log_listener: Optional[QueueListener] = None
+
+
+def setup_logging(process_name: Optional[str] = None) -> None:
+    # replaces any handler from before a fork, the listener thread of the parent does not exist in the child
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+
+    log_limits["sample"] = parse_category_values(os.getenv("LOG_SAMPLE", ""))
+    log_limits["rate"] = parse_category_values(os.getenv("LOG_RATE_LIMIT", ""))
+    for event_log in event_logs.values():
+        configure_event_log(event_log)
+
+    stream_handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        stream_handler.setFormatter(JsonFormatter({} if process_name is None else {"process": process_name}))
+    else:
+        prefix = "" if process_name is None else f"<{process_name}> "
+        stream_handler.setFormatter(TextFormatter(f"%(asctime)s: {prefix}%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    logging.basicConfig(handlers=[LoopQueueHandler(log_queue)], level=os.getenv("LOG_LEVEL", "INFO").upper(), force=True)
+    log_listener = QueueListener(log_queue, stream_handler)
+    log_listener.start()
+
+
+def stop_logging() -> None:
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+atexit.register(stop_logging)
@@ -1,8 +1,9 @@
 import asyncio
-import json
 import logging
-from json import JSONDecodeError
-from typing import Dict, Callable, Awaitable, Optional
+import os
+import threading
+import time
+from typing import Dict, Callable, Awaitable, Optional, Type
 
 import aiohttp
 from aiohttp import web, WSMsgType
@@ -10,103 +11,397 @@ from aiohttp.web import Request, Response
 from aiohttp.web_fileresponse import FileResponse
 from aiohttp.web_ws import WebSocketResponse
 
+import codec
+import metrics
+import tracing
 from card import CardManager
-from events.create import create_event_handler
-from events.join import join_event_handler
-from events.leave import leave_event_handler
-from events.play import play_event_handler
-from events.search import search_event_handler
-from events.signin import SignInEvent
-from events.start import start_event_handler
-from game import GameManager
-from player import Player
+from events.create import create_event_handler, CreateClientEvent
+from events.join import join_event_handler, JoinClientEvent
+from events.leave import leave_event_handler, close_game, LeaveClientEvent
+from events.lobby import subscribe_lobby_event_handler, unsubscribe_lobby_event_handler, SubscribeLobbyClientEvent, UnsubscribeLobbyClientEvent
+from events.play import play_event_handler, turn_timeout_handler, action_rules
+from events.queue import queue_event_handler, leave_queue_event_handler, QueueClientEvent, LeaveQueueClientEvent
+from events.redirect import RedirectServerEvent, route_shard
+from events.schema import ClientEvent, EventDecoder, MAX_EVENT_SIZE
+from events.search import search_event_handler, SearchClientEvent
+from events.signin import SignInEvent, SignInClientEvent, ResumeServerEvent
+from events.start import start_event_handler, StartClientEvent
+from game import Game, GameManager, GameState
+from log import get_logger, setup_logging
+from player import Player, OutboxOverflowPolicy
+from reaper import GameReaper
+from session import SessionManager, new_session_token
+from shard import ShardFront
+from store import create_game_store
+from timers import TurnTimers
+
+event_log = get_logger("event")
+signin_log = get_logger("signin")
+redirect_log = get_logger("redirect")
+logout_log = get_logger("logout")
+reaper_log = get_logger("reaper", is_tagged=False)
+admin_log = get_logger("admin", is_tagged=False)
 
 
 class App:
-    def __init__(self):
-        self.game_mgr = GameManager()
+    def __init__(self, shard_index: int = 0, shard_count: int = 1):
+        game_seed = os.getenv("GAME_SEED")
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.game_mgr = GameManager(
+            None if game_seed is None else int(game_seed) + shard_index,
+            float(os.getenv("LOBBY_FEED_WINDOW", "0.25")),
+            shard_index,
+            shard_count,
+            create_game_store(os.getenv("GAME_STORE")),
+            GameReaper(
+                float(os.getenv("GAME_WAITING_TIMEOUT", "600")),
+                float(os.getenv("GAME_END_TIMEOUT", "60")),
+                float(os.getenv("GAME_IDLE_TIMEOUT", "1800"))
+            ),
+            TurnTimers({
+                GameState.TURN: float(os.getenv("TURN_TIMEOUT", "60")),
+                GameState.COUNTER: float(os.getenv("COUNTER_TIMEOUT", "20"))
+            })
+        )
+        self.reaper_interval = float(os.getenv("REAPER_INTERVAL", "5"))
+        # half open connections are noticed through missed pongs instead of waiting for tcp
+        self.ws_heartbeat = float(os.getenv("WS_HEARTBEAT", "30")) or None
         self.card_mgr = CardManager()
-        self.event_handlers: Dict[str, Callable[[Dict, Player, GameManager, CardManager], Awaitable[None]]] = {
-            "create": create_event_handler,
-            "search": search_event_handler,
-            "join": join_event_handler,
-            "leave": leave_event_handler,
-            "start": start_event_handler,
-            "play": play_event_handler
+        self.session_mgr = SessionManager(float(os.getenv("SESSION_GRACE_PERIOD", "30")))
+        Player.configure_outbox(
+            int(os.getenv("OUTBOX_HIGH_WATER", "256")),
+            int(os.getenv("OUTBOX_LOW_WATER", "64")),
+            OutboxOverflowPolicy[os.getenv("OUTBOX_OVERFLOW_POLICY", "disconnect").upper()]
+        )
+        tracing.tracer.configure(float(os.getenv("TRACE_SAMPLE_RATE", "0")), int(os.getenv("TRACE_BUFFER", "1000")))
+        self.profiler: Optional[tracing.SamplingProfiler] = None
+        self.event_handlers: Dict[Type[ClientEvent], Callable[[ClientEvent, Player, GameManager, CardManager], Awaitable[None]]] = {
+            CreateClientEvent: create_event_handler,
+            SearchClientEvent: search_event_handler,
+            JoinClientEvent: join_event_handler,
+            LeaveClientEvent: leave_event_handler,
+            StartClientEvent: start_event_handler,
+            SubscribeLobbyClientEvent: subscribe_lobby_event_handler,
+            UnsubscribeLobbyClientEvent: unsubscribe_lobby_event_handler,
+            QueueClientEvent: queue_event_handler,
+            LeaveQueueClientEvent: leave_queue_event_handler,
+            **{action_event: play_event_handler for action_event in action_rules}
         }
+        self.event_decoder = EventDecoder([SignInClientEvent, *self.event_handlers])
+        self.register_metrics()
 
     async def websocket_handler(self, request: Request) -> WebSocketResponse:
-        ws = WebSocketResponse()
+        ws = WebSocketResponse(max_msg_size=MAX_EVENT_SIZE, heartbeat=self.ws_heartbeat)
         await ws.prepare(request)
 
+        metrics.connections.inc()
+        try:
+            await self.handle_connection(ws)
+        finally:
+            metrics.connections.dec()
+        return ws
+
+    async def handle_connection(self, ws: WebSocketResponse) -> None:
         # == handle player events ==
         player: Optional[Player] = None
         has_error = False
         async for msg in ws:
-            if msg.type == WSMsgType.TEXT:
+            if msg.type == WSMsgType.TEXT or msg.type == WSMsgType.BINARY:
+                trace = tracing.tracer.begin()
                 try:
-                    event = json.loads(msg.data)
-                except JSONDecodeError:
-                    logging.info(f"{player}: ('event') Invalid event format sent. Skipping.")
+                    event = self.event_decoder.decode(msg.data)
+                except ValueError as e:
+                    metrics.invalid_events.inc()
+                    event_log.info(player, "Invalid event sent (%s). Skipping.", e)
+                    if trace is not None:
+                        tracing.tracer.finish(trace, None, player, None)
                     continue
 
-                if "type" not in event:
-                    logging.info(f"{player}: ('event') Invalid event format sent. Skipping.")
-                    continue
-
-                event_type = event["type"]
-                logging.info(f"{player}: ('event') Sent event '{event_type}'")
+                event_log.info(player, "Sent event '%s'", event.TYPE)
+                metrics.events.inc(event.TYPE, event.ACTION or "")
+                handler_start = time.perf_counter()
 
-                if event_type == "signin":
-                    if "playerName" not in event:
-                        logging.info("[Unknown]: ('signin') Missing values. Skipping.")
-                        continue
+                if isinstance(event, SignInClientEvent):
+                    resumed_player = self.session_mgr.get(event.session_token)
+                    if player is not None and player is not resumed_player:
+                        # the previous player of this connection leaves its game, it can never be resumed again
+                        await self.logout(player)
+                        await self.end_session(player)
 
-                    player_name = event["playerName"]
-                    player = Player(ws, player_name)
+                    if resumed_player is not None:
+                        player = resumed_player
+                        await self.resume_session(player, ws)
+                    else:
+                        # only the shard front may start a session under a token of its own, clients never pick one
+                        is_token_trusted = self.shard_count > 1 and event.session_token is not None
+                        player = Player(ws, event.player_name, event.session_token if is_token_trusted else new_session_token())
+                        self.session_mgr.register(player)
+                        player.start()
 
-                    logging.info(f"{player}: ('signin') Signed in.")
-                    await player.send_event(SignInEvent(True).to_dict())
-                elif event_type in self.event_handlers:
-                    await self.event_handlers[event_type](event, player, self.game_mgr, self.card_mgr)
+                        signin_log.info(player, "Signed in.")
+                        await player.send_event(SignInEvent(True, player.session_token).to_dict())
+                elif player is None:
+                    event_log.info("[Unknown]", "Not signed in. Skipping.")
+                elif self.is_redirected(event, player):
+                    shard_index = route_shard(event, self.shard_count)
+                    redirect_log.info(player, "'%s' belongs to shard %s.", event.TYPE, shard_index)
+                    await player.send_event(RedirectServerEvent(shard_index).to_dict())
                 else:
-                    logging.info(f"{player}: ('event') Unknown event '{event_type}'. Skipping.")
+                    game_id = player.game_id
+                    await self.event_handlers[type(event)](event, player, self.game_mgr, self.card_mgr)
+                    self.touch_games(game_id, player)
+                metrics.handler_seconds.observe(time.perf_counter() - handler_start, event.TYPE)
+
+                if trace is not None:
+                    trace.mark("apply")
+                    tracing.tracer.finish(trace, event, player, None if player is None else player.game_id)
             elif msg.type == WSMsgType.ERROR:
                 has_error = True
-                logging.info(f"{player}: ('event') Error in websocket: {ws.exception()}")
+                event_log.info(player, "Error in websocket: %s", ws.exception())
 
         #  == handle player disconnect ==
-        if not has_error and player is not None:
-            logging.info(f"{player}: ('logout') Logging out.")
-            # leave room if player is in any
-            if player.game_id is not None:
-                await leave_event_handler({"type": "leave"}, player, self.game_mgr, self.card_mgr)
+        if player is None or player.ws is not ws:
+            # never signed in, or the session was resumed on another connection
+            return
 
-            logging.info(f"{player}: ('logout') Logged out.")
+        if player.game_id is not None and self.session_mgr.is_enabled():
+            logout_log.info(player, "Connection lost. Keeping player for %ss.", self.session_mgr.grace_period)
+            self.game_mgr.lobby_feed.unsubscribe(player)
+            self.game_mgr.matchmaker.cancel(player)
+            await player.detach()
+            self.session_mgr.detach(player, self.expire_session)
+            return
 
-        return ws
+        if not has_error:
+            await self.logout(player)
+        await self.end_session(player)
+
+    async def logout(self, player: Player) -> None:
+        logout_log.info(player, "Logging out.")
+        # leave room if player is in any
+        if player.game_id is not None:
+            game_id = player.game_id
+            await leave_event_handler(LeaveClientEvent(), player, self.game_mgr, self.card_mgr)
+            self.touch_games(game_id, player)
+
+        logout_log.info(player, "Logged out.")
+
+    async def end_session(self, player: Player) -> None:
+        self.session_mgr.unregister(player)
+        self.game_mgr.lobby_feed.unsubscribe(player)
+        self.game_mgr.matchmaker.cancel(player)
+        await player.close()
+
+    async def expire_session(self, player: Player) -> None:
+        await self.logout(player)
+
+    async def resume_session(self, player: Player, ws: WebSocketResponse) -> None:
+        if player.is_detached():
+            self.session_mgr.resume(player)
+            player.attach(ws)
+        elif player.ws is not ws:
+            # the client gave up on a connection the server still thinks is alive
+            previous_ws = player.ws
+            await player.detach()
+            player.attach(ws)
+            await previous_ws.close()
+
+        signin_log.info(player, "Resumed session.")
+        await player.send_event(SignInEvent(True, player.session_token, True).to_dict())
+
+        game = None if player.game_id is None else self.game_mgr.get_game(player.game_id)
+        if game is not None:
+            await player.send_event(ResumeServerEvent(game, player).to_dict())
+
+    def touch_games(self, previous_game_id: Optional[int], player: Player) -> None:
+        # the game the player was in before the event and the one it is in now may both have changed
+        if previous_game_id is not None:
+            self.game_mgr.touch_game(previous_game_id)
+        if player.game_id is not None and player.game_id != previous_game_id:
+            self.game_mgr.touch_game(player.game_id)
+
+    def is_redirected(self, event: ClientEvent, player: Player) -> bool:
+        # a player in a room stays on its shard, the handler turns the event down there
+        if player.game_id is not None:
+            return False
+        shard_index = route_shard(event, self.shard_count)
+        return shard_index is not None and shard_index != self.shard_index
+
+    def register_metrics(self) -> None:
+        # read at scrape time, so the hot paths pay nothing for them
+        metrics.registry.register(metrics.Gauge(
+            "cyberwar_games", "Games by state", ("state",), self.count_games_by_state
+        ))
+        metrics.registry.register(metrics.Gauge(
+            "cyberwar_outbox_frames", "Frames waiting in player outboxes", ("stat",), self.measure_outboxes
+        ))
+        metrics.registry.register(metrics.Gauge(
+            "cyberwar_detached_players", "Players waiting for their connection to come back",
+            callback=lambda: {(): len(self.session_mgr.expiry_handles)}
+        ))
+        metrics.registry.register(metrics.Gauge(
+            "cyberwar_matchmaking_queue", "Players waiting in the matchmaking queue",
+            callback=lambda: {(): len(self.game_mgr.matchmaker)}
+        ))
+        metrics.registry.register(metrics.Gauge(
+            "cyberwar_lobby_subscribers", "Players subscribed to the lobby feed",
+            callback=lambda: {(): len(self.game_mgr.lobby_feed.subscribers)}
+        ))
+
+    def count_games_by_state(self) -> Dict:
+        counts = {(state.name.lower(),): 0 for state in GameState}
+        for game in self.game_mgr.games:
+            counts[(game.game_state.name.lower(),)] += 1
+        return counts
+
+    def measure_outboxes(self) -> Dict:
+        sizes = [player.outbox_size for player in self.session_mgr.players.values()]
+        return {
+            ("total",): sum(sizes),
+            ("max",): max(sizes, default=0),
+            ("lagging",): sum(1 for player in self.session_mgr.players.values() if player.is_lagging)
+        }
+
+    async def reap_games(self) -> None:
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            for game in self.game_mgr.reaper.expired(self.game_mgr.games):
+                reaper_log.info("[Reaper]", "Closing %s, idle in %s state.", game, game.game_state.name.lower())
+                await close_game(game, self.game_mgr)
+
+    async def expire_turn(self, game: Game) -> None:
+        await turn_timeout_handler(game, self.game_mgr, self.card_mgr)
+
+    async def start_reaper_handler(self, app: web.Application) -> None:
+        app["reaper_task"] = asyncio.create_task(self.reap_games())
+        app["turn_timers_task"] = asyncio.create_task(self.game_mgr.turn_timers.run(self.game_mgr.games, self.expire_turn))
+
+    async def stop_reaper_handler(self, app: web.Application) -> None:
+        app["reaper_task"].cancel()
+        app["turn_timers_task"].cancel()
+
+    async def refresh_cards_handler(self, app: web.Application) -> None:
+        # keep a reference so the refresh task is not garbage collected before it finishes
+        app["card_refresh_task"] = asyncio.create_task(self.card_mgr.refresh_from_database())
+
+    async def start_store_handler(self, app: web.Application) -> None:
+        self.game_mgr.games.start()
+        # restored players get the same grace period as players that just lost their connection
+        for game in self.game_mgr.games:
+            for game_player in game.players:
+                if game_player.session_token is not None and self.session_mgr.is_enabled():
+                    self.session_mgr.register(game_player)
+                    self.session_mgr.detach(game_player, self.expire_session)
+
+    async def close_store_handler(self, app: web.Application) -> None:
+        await self.game_mgr.games.close()
+
+    async def reload_cards_handler(self, request: Request) -> Response:
+        check_admin(request)
+
+        source = request.query.get("source", "database" if self.card_mgr.is_database_configured() else "snapshot")
+        if source not in ("database", "snapshot"):
+            raise web.HTTPBadRequest(text=f"Unknown source '{source}'")
+
+        try:
+            load_start = time.perf_counter()
+            is_changed = await self.card_mgr.reload(from_database=source == "database")
+            metrics.card_load_seconds.set(time.perf_counter() - load_start)
+        except Exception as e:
+            admin_log.info("[Admin]", "Reloading cards from %s failed: %r", source, e)
+            raise web.HTTPInternalServerError(text=f"Reload failed: {e}")
+
+        return web.json_response({
+            "changed": is_changed,
+            "version": self.card_mgr.catalog.version,
+            "cards": len(self.card_mgr.deck)
+        })
+
+    async def slow_events_handler(self, request: Request) -> Response:
+        check_admin(request)
+        if not tracing.tracer.is_enabled:
+            raise web.HTTPNotFound(text="Tracing is disabled, set TRACE_SAMPLE_RATE")
+
+        limit = int(request.query.get("limit", "20"))
+        return web.json_response({
+            "sampleRate": tracing.tracer.sample_rate,
+            "traced": len(tracing.tracer.recent),
+            "events": [trace.to_dict() for trace in tracing.tracer.slowest(limit)]
+        })
+
+    async def profile_handler(self, request: Request) -> Response:
+        # samples the event loop for a while and answers with collapsed stacks
+        check_admin(request)
+        if self.profiler is not None:
+            raise web.HTTPConflict(text="A profile is already running")
+
+        seconds = min(float(request.query.get("seconds", "10")), tracing.PROFILE_MAX_SECONDS)
+        interval = float(request.query.get("interval", "5")) / 1000
+        self.profiler = tracing.SamplingProfiler(threading.get_ident(), interval)
+        self.profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler = self.profiler
+            self.profiler = None
+            await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+
+        admin_log.info("[Admin]", "Profiled %s samples over %ss.", profiler.sample_count, seconds)
+        return Response(text=profiler.collapsed())
+
+    async def metrics_handler(self, request: Request) -> Response:
+        return Response(body=metrics.registry.render().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
 
     async def index_handler(self, request: Request) -> FileResponse:
         return FileResponse("./www/index.html")
 
-    def run(self):
-        logging.info("Retrieving latest card definitions")
-        self.card_mgr.fetch_from_database()
+    def run(self, host: Optional[str] = None, port: Optional[int] = None):
+        logging.info(f"Using {codec.get_codec().name} codec")
+
+        logging.info(f"Retrieving latest card definitions ({self.card_mgr.mode} mode)")
+        load_start = time.perf_counter()
+        self.card_mgr.load()
+        metrics.card_load_seconds.set(time.perf_counter() - load_start)
+        logging.info(f"Loaded {len(self.card_mgr.deck)} cards in {(time.perf_counter() - load_start) * 1000:.1f}ms")
+
+        restored_count = self.game_mgr.restore_games(self.card_mgr.catalog)
+        logging.info(f"Using {self.game_mgr.games.name} game store, restored {restored_count} games")
 
         app = web.Application()
+        app.on_startup.append(self.start_store_handler)
+        app.on_cleanup.append(self.close_store_handler)
+        app.on_startup.append(self.start_reaper_handler)
+        app.on_cleanup.append(self.stop_reaper_handler)
+        if self.card_mgr.is_refresh_enabled():
+            app.on_startup.append(self.refresh_cards_handler)
         app.add_routes([
             web.get("/ws", self.websocket_handler),
+            web.post("/admin/cards/reload", self.reload_cards_handler),
+            web.get("/metrics", self.metrics_handler),
+            web.get("/debug/slow-events", self.slow_events_handler),
+            web.get("/debug/profile", self.profile_handler),
             web.get("/", self.index_handler),
             web.static("/static", "./www")
         ])
-        web.run_app(app)
+        web.run_app(app, host=host, port=port)
+
+
+def check_admin(request: Request) -> None:
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if admin_token is None or request.headers.get("Authorization") != f"Bearer {admin_token}":
+        raise web.HTTPForbidden()
 
 
 if __name__ == "__main__":
-    logging.basicConfig(format="%(asctime)s: %(message)s", level=logging.INFO)
+    setup_logging()
 
     logging.info("Application started")
     try:
-        App().run()
+        shard_count = int(os.getenv("SHARDS", "1"))
+        if shard_count > 1:
+            ShardFront(shard_count).run()
+        else:
+            App().run()
     except KeyboardInterrupt:
         logging.info("Application ended")
@@ -0,0 +1,45 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from player import Player
+
+
+class Matchmaker:
+    # first come first served queue, players that left are only dropped when they reach the front
+    __slots__ = ("group_size", "queue", "queued")
+
+    def __init__(self, group_size: int) -> None:
+        self.group_size = group_size
+        self.queue: Deque[Player] = deque()
+        self.queued: Dict[Player, None] = {}
+
+    def enqueue(self, player: Player) -> Optional[List[Player]]:
+        if player in self.queued:
+            return None
+
+        self.queue.append(player)
+        self.queued[player] = None
+
+        if len(self.queued) < self.group_size:
+            return None
+
+        group: List[Player] = []
+        while len(group) < self.group_size:
+            queued_player = self.queue.popleft()
+            if queued_player in self.queued:
+                del self.queued[queued_player]
+                group.append(queued_player)
+        return group
+
+    def cancel(self, player: Player) -> bool:
+        if player not in self.queued:
+            return False
+
+        del self.queued[player]
+        # drop cancelled players at the front right away, so the deque does not grow with churn
+        while self.queue and self.queue[0] not in self.queued:
+            self.queue.popleft()
+        return True
+
+    def __len__(self) -> int:
+        return len(self.queued)
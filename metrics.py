@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# the event loop is the only writer, so plain ints and floats are enough
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ("name", "help", "label_names", "values")
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for label_values, value in self.values.items():
+            yield f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"
+
+
+class Gauge:
+    # either set directly or read from a callback at scrape time
+    __slots__ = ("name", "help", "label_names", "values", "callback")
+    TYPE = "gauge"
+
+    def __init__(self,
+                 name: str,
+                 help: str,
+                 label_names: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *label_values: str) -> None:
+        self.values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self) -> Iterable[str]:
+        values = self.values if self.callback is None else self.callback()
+        for label_values, value in values.items():
+            yield f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"
+
+
+class Histogram:
+    __slots__ = ("name", "help", "label_names", "buckets", "series")
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values to [per bucket counts (last one is +Inf), sum, count], made cumulative when rendered
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> Iterable[str]:
+        for label_values, (bucket_counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = format_labels(self.label_names, label_values, f'le="{format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            labels = format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def label_exposition(text: str, label: str) -> List[Tuple[str, str]]:
+    # (family name, line) of every line, with the label added to every sample
+    lines = []
+    family = ""
+    for line in text.splitlines():
+        if line.startswith("#"):
+            family = line.split(" ", 3)[2]
+            lines.append((family, line))
+            continue
+        if not line:
+            continue
+        name, _, value = line.rpartition(" ")
+        if name.endswith("}"):
+            name = f"{name[:-1]},{label}}}"
+        else:
+            name = f"{name}{{{label}}}"
+        lines.append((family, f"{name} {value}"))
+    return lines
+
+
+def merge_expositions(texts: Iterable[Tuple[str, str]]) -> str:
+    # one exposition out of many (label, text) pairs, each family keeps a single HELP and TYPE line
+    families: Dict[str, List[str]] = {}
+    for label, text in texts:
+        for family, line in label_exposition(text, label):
+            family_lines = families.setdefault(family, [])
+            if line.startswith("#") and line in family_lines:
+                continue
+            family_lines.append(line)
+    return "\n".join([line for family_lines in families.values() for line in family_lines]) + "\n"
+
+
+registry = Registry()
+
+connections = registry.register(Gauge("cyberwar_connections", "Open websocket connections"))
+events = registry.register(Counter("cyberwar_events_total", "Client events handled", ("type", "action")))
+invalid_events = registry.register(Counter("cyberwar_invalid_events_total", "Client frames that failed to decode"))
+handler_seconds = registry.register(Histogram("cyberwar_handler_seconds", "Time spent in event handlers", ("type",)))
+encode_seconds = registry.register(Histogram("cyberwar_encode_seconds", "Time spent encoding server events"))
+card_load_seconds = registry.register(Gauge("cyberwar_card_load_seconds", "Duration of the last card catalog load"))
@@ -1,16 +1,202 @@
-from typing import Optional, Dict
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+from typing import Optional, Dict, Deque, List, Tuple, Union
 
+from aiohttp import WSCloseCode, WSMsgType
 from aiohttp.web_ws import WebSocketResponse
 
+import codec
+import tracing
+from log import get_logger
+
+log = get_logger("player", is_tagged=False)
+
+
+class OutboxOverflowPolicy(Enum):
+    DROP = 0
+    DISCONNECT = 1
+
+
+# events that only carry the latest state, an unsent one is superseded by a newer one
+COALESCED_EVENTS: List[Tuple[str, Optional[str]]] = [
+    ("play", "turn"),
+]
+
+
+# newer aiohttp can write encoded bytes as a text frame directly, older ones such as the locked 3.8 only send a str,
+# frames for them are encoded straight to str so they are never decoded again per recipient
+IS_BYTES_TEXT_FRAME_SUPPORTED = hasattr(WebSocketResponse, "send_frame")
+
+
+def encode_frame(event: Dict) -> Union[bytes, str]:
+    if IS_BYTES_TEXT_FRAME_SUPPORTED:
+        return codec.encode(event)
+    return codec.encode_text(event)
+
+
+async def send_text_frame(ws: WebSocketResponse, frame: Union[bytes, str]) -> None:
+    if isinstance(frame, str):
+        await ws.send_str(frame)
+    elif IS_BYTES_TEXT_FRAME_SUPPORTED:
+        await ws.send_frame(frame, WSMsgType.TEXT)
+    else:
+        await ws.send_str(frame.decode("utf-8"))
+
+
+def coalesce_key(event: Dict) -> Optional[str]:
+    event_type = event.get("type")
+    event_action = event.get("action")
+    if (event_type, event_action) in COALESCED_EVENTS:
+        return f"{event_type}:{event_action}"
+    return None
+
 
 class Player:
-    def __init__(self, ws: WebSocketResponse, name: str) -> None:
+    __slots__ = (
+        "ws", "name", "session_token", "game_id", "outbox", "outbox_size", "outbox_pending",
+        "outbox_waiter", "is_lagging", "is_closed", "writer_task"
+    )
+
+    # shared by every player, set through configure_outbox
+    OUTBOX_HIGH_WATER = 256
+    OUTBOX_LOW_WATER = 64
+    OUTBOX_OVERFLOW_POLICY = OutboxOverflowPolicy.DISCONNECT
+
+    def __init__(self, ws: Optional[WebSocketResponse], name: str, session_token: Optional[str] = None) -> None:
+        # None while the player is detached from any connection
         self.ws = ws
         self.name = name
+        self.session_token = session_token
         self.game_id: Optional[int] = None
 
+        # each entry is [frame, coalesce key], a superseded entry has its frame cleared in place
+        self.outbox: Deque[List] = deque()
+        self.outbox_size = 0
+        self.outbox_pending: Dict[str, List] = {}
+        # only exists while the writer is parked on an empty outbox
+        self.outbox_waiter: Optional[asyncio.Future] = None
+        self.is_lagging = False
+        self.is_closed = False
+        self.writer_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def configure_outbox(cls, high_water: int, low_water: int, overflow_policy: OutboxOverflowPolicy) -> None:
+        if not 0 <= low_water < high_water:
+            raise ValueError(f"Outbox low water {low_water} must be below high water {high_water}")
+        cls.OUTBOX_HIGH_WATER = high_water
+        cls.OUTBOX_LOW_WATER = low_water
+        cls.OUTBOX_OVERFLOW_POLICY = overflow_policy
+
+    def start(self) -> None:
+        self.writer_task = asyncio.create_task(self.write_outbox())
+
+    async def close(self) -> None:
+        self.is_closed = True
+        self.outbox.clear()
+        self.outbox_pending.clear()
+        self.outbox_size = 0
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+            self.writer_task = None
+
+    async def detach(self) -> None:
+        # events sent while detached are dropped, a resumed player gets the game state instead
+        await self.close()
+        self.ws = None
+
+    def attach(self, ws: WebSocketResponse) -> None:
+        self.ws = ws
+        self.is_closed = False
+        self.is_lagging = False
+        self.start()
+
+    def is_detached(self) -> bool:
+        return self.ws is None
+
     async def send_event(self, event: Dict) -> None:
-        await self.ws.send_json(event)
+        self.enqueue(encode_frame(event), coalesce_key(event))
+
+    async def send_frame(self, frame: Union[bytes, str], key: Optional[str] = None) -> None:
+        self.enqueue(frame, key)
+
+    def enqueue(self, frame: Union[bytes, str], key: Optional[str] = None) -> None:
+        if self.is_closed:
+            return
+
+        superseded = None if key is None else self.outbox_pending.get(key)
+        if superseded is None:
+            if self.outbox_size >= self.OUTBOX_HIGH_WATER:
+                self.is_lagging = True
+
+            if self.is_lagging:
+                if self.OUTBOX_OVERFLOW_POLICY == OutboxOverflowPolicy.DISCONNECT:
+                    log.info(self, "Outbox over %s events. Disconnecting.", self.OUTBOX_HIGH_WATER)
+                    self.is_closed = True
+                    self.outbox.clear()
+                    self.outbox_pending.clear()
+                    self.outbox_size = 0
+                    self.wake_writer()
+                    return
+                else:
+                    log.info(self, "Outbox over %s events. Dropping event.", self.OUTBOX_HIGH_WATER)
+                    return
+        else:
+            # replacing a pending frame does not grow the outbox, so the latest state gets through even while lagging
+            superseded[0] = None
+            self.outbox_size -= 1
+
+        entry = [frame, key]
+        self.outbox.append(entry)
+        self.outbox_size += 1
+        if key is not None:
+            self.outbox_pending[key] = entry
+        self.wake_writer()
+
+    def wake_writer(self) -> None:
+        if self.outbox_waiter is not None and not self.outbox_waiter.done():
+            self.outbox_waiter.set_result(None)
+
+    async def write_outbox(self) -> None:
+        while True:
+            if self.is_closed:
+                # overflowed with the disconnect policy
+                await self.ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b"Too slow")
+                return
+
+            if not self.outbox:
+                self.outbox_waiter = asyncio.get_running_loop().create_future()
+                await self.outbox_waiter
+                self.outbox_waiter = None
+                continue
+
+            entry = self.outbox.popleft()
+            frame, key = entry
+            if frame is None:
+                continue
+            if key is not None and self.outbox_pending.get(key) is entry:
+                del self.outbox_pending[key]
+            self.outbox_size -= 1
+
+            try:
+                if tracing.tracer.is_enabled:
+                    send_start = time.perf_counter()
+                    await send_text_frame(self.ws, frame)
+                    tracing.tracer.observe_send(time.perf_counter() - send_start)
+                else:
+                    await send_text_frame(self.ws, frame)
+            except (ConnectionError, RuntimeError) as e:
+                log.info(self, "Failed to send event: %r. Stopping writer.", e)
+                self.is_closed = True
+                return
+
+            if self.is_lagging and self.outbox_size <= self.OUTBOX_LOW_WATER:
+                self.is_lagging = False
 
     def __str__(self) -> str:
         return f"[{self.name}]"
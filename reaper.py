@@ -0,0 +1,63 @@
+import time
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from game import Game
+    from store import GameStore
+
+
+class GameReaper:
+    # deadlines of every game in a heap, activity only pushes a new entry when it brings the deadline forward
+    __slots__ = ("waiting_timeout", "end_timeout", "idle_timeout", "deadlines", "scheduled")
+
+    def __init__(self, waiting_timeout: float = 600.0, end_timeout: float = 60.0, idle_timeout: float = 1800.0) -> None:
+        self.waiting_timeout = waiting_timeout
+        self.end_timeout = end_timeout
+        self.idle_timeout = idle_timeout
+        # (deadline, game id), entries that do not match the scheduled deadline of their game are stale
+        self.deadlines: List[Tuple[float, int]] = []
+        self.scheduled: Dict[int, float] = {}
+
+    def track(self, game: "Game") -> None:
+        deadline = self.deadline(game)
+        scheduled = self.scheduled.get(game.game_id)
+        if scheduled is None or deadline < scheduled:
+            self.scheduled[game.game_id] = deadline
+            heappush(self.deadlines, (deadline, game.game_id))
+
+    def forget(self, game_id: int) -> None:
+        self.scheduled.pop(game_id, None)
+
+    def deadline(self, game: "Game") -> float:
+        if not game.is_in_progress():
+            timeout = self.waiting_timeout
+        elif game.is_ended():
+            timeout = self.end_timeout
+        else:
+            timeout = self.idle_timeout
+        return game.last_activity + timeout
+
+    def expired(self, games: "GameStore", now: Optional[float] = None) -> List["Game"]:
+        if now is None:
+            now = time.monotonic()
+
+        expired_games = []
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, game_id = heappop(self.deadlines)
+            if self.scheduled.get(game_id) != deadline:
+                continue
+            del self.scheduled[game_id]
+
+            game = games.get(game_id)
+            if game is None:
+                continue
+            # the game was active since the entry was pushed
+            if self.deadline(game) > now:
+                self.track(game)
+            else:
+                expired_games.append(game)
+        return expired_games
+
+    def __len__(self) -> int:
+        return len(self.scheduled)
@@ -0,0 +1,67 @@
+import asyncio
+import secrets
+from typing import Dict, Callable, Awaitable, Optional, Set
+
+from log import get_logger
+from player import Player
+
+log = get_logger("session")
+
+SESSION_TOKEN_BYTES = 16
+
+
+def new_session_token() -> str:
+    return secrets.token_urlsafe(SESSION_TOKEN_BYTES)
+
+
+class SessionManager:
+    # signed in players by session token, a player that lost its connection is kept detached for a grace period
+    __slots__ = ("grace_period", "players", "expiry_handles", "expiry_tasks")
+
+    def __init__(self, grace_period: float) -> None:
+        self.grace_period = grace_period
+        self.players: Dict[str, Player] = {}
+        self.expiry_handles: Dict[str, asyncio.TimerHandle] = {}
+        self.expiry_tasks: Set[asyncio.Task] = set()
+
+    def get(self, session_token: Optional[str]) -> Optional[Player]:
+        if session_token is None:
+            return None
+        return self.players.get(session_token)
+
+    def register(self, player: Player) -> None:
+        self.players[player.session_token] = player
+
+    def unregister(self, player: Player) -> None:
+        if self.players.get(player.session_token) is player:
+            del self.players[player.session_token]
+        self.cancel_expiry(player)
+
+    def is_enabled(self) -> bool:
+        return self.grace_period > 0
+
+    def detach(self, player: Player, on_expire: Callable[[Player], Awaitable[None]]) -> None:
+        self.cancel_expiry(player)
+        self.expiry_handles[player.session_token] = asyncio.get_running_loop().call_later(
+            self.grace_period, self.expire, player, on_expire
+        )
+
+    def resume(self, player: Player) -> None:
+        self.cancel_expiry(player)
+
+    def cancel_expiry(self, player: Player) -> None:
+        handle = self.expiry_handles.pop(player.session_token, None)
+        if handle is not None:
+            handle.cancel()
+
+    def expire(self, player: Player, on_expire: Callable[[Player], Awaitable[None]]) -> None:
+        self.expiry_handles.pop(player.session_token, None)
+        if not player.is_detached():
+            return
+
+        log.info(player, "Not back within %ss. Ending session.", self.grace_period)
+        self.unregister(player)
+        # keep a reference so the task is not garbage collected before it finishes
+        task = asyncio.create_task(on_expire(player))
+        self.expiry_tasks.add(task)
+        task.add_done_callback(self.expiry_tasks.discard)
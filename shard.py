@@ -0,0 +1,394 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional, Set, Union
+
+import aiohttp
+from aiohttp import web, WSMsgType
+from aiohttp.web import Request, Response
+from aiohttp.web_fileresponse import FileResponse
+from aiohttp.web_ws import WebSocketResponse
+
+import codec
+import metrics
+from events.join import JoinClientEvent
+from events.lobby import SubscribeLobbyClientEvent, UnsubscribeLobbyClientEvent, SubscribeLobbyServerEvent
+from events.queue import QueueClientEvent
+from events.redirect import REDIRECT_FRAME_PREFIX
+from events.schema import MAX_EVENT_SIZE
+from events.search import SearchClientEvent, SearchServerEvent, search_lobby, SEARCH_PAGE_MAX_LIMIT
+from events.signin import SignInClientEvent
+from lobby import LobbyIndex, LobbyFeed, LobbyEntry, LobbyChange
+from log import get_logger, setup_logging
+from player import Player, OutboxOverflowPolicy
+from session import new_session_token
+
+shard_log = get_logger("shard")
+search_log = get_logger("search")
+event_log = get_logger("event")
+front_log = get_logger("shard_front", is_tagged=False)
+
+SIGNIN_FRAME_PREFIX = '{"type":"signin"'
+
+DIRECTORY_PLAYER_NAME = "Lobby Directory"
+DIRECTORY_RETRY_DELAY = 1.0
+
+
+def run_shard(shard_index: int, shard_count: int, port: int) -> None:
+    # imported here, main imports this module to start the front
+    from main import App
+
+    setup_logging(f"shard {shard_index}")
+    try:
+        App(shard_index, shard_count).run(host="127.0.0.1", port=port)
+    except KeyboardInterrupt:
+        pass
+
+
+class LobbyDirectory:
+    # waiting games of every shard, followed through the lobby feed of each shard
+    __slots__ = ("lobby", "lobby_feed", "shard_game_ids")
+
+    def __init__(self, shard_count: int, lobby_feed_window: float) -> None:
+        self.lobby = LobbyIndex()
+        self.lobby_feed = LobbyFeed(lobby_feed_window)
+        self.shard_game_ids: List[Set[int]] = [set() for _ in range(shard_count)]
+
+    def put(self, shard_index: int, entry: LobbyEntry) -> None:
+        change = LobbyChange.UPDATED if entry.game_id in self.lobby.entries else LobbyChange.CREATED
+        self.lobby.put(entry)
+        self.shard_game_ids[shard_index].add(entry.game_id)
+        self.lobby_feed.publish(change, entry)
+
+    def remove(self, shard_index: int, game_id: int) -> None:
+        self.shard_game_ids[shard_index].discard(game_id)
+        entry = self.lobby.remove(game_id)
+        if entry is not None:
+            self.lobby_feed.publish(LobbyChange.REMOVED, entry)
+
+    def clear_shard(self, shard_index: int) -> None:
+        for game_id in list(self.shard_game_ids[shard_index]):
+            self.remove(shard_index, game_id)
+
+    def apply(self, shard_index: int, event: Dict) -> None:
+        if event.get("type") == "lobby":
+            for change in event["changes"]:
+                if change["change"] == LobbyChange.REMOVED:
+                    self.remove(shard_index, change["gameId"])
+                else:
+                    self.put(shard_index, LobbyEntry(change["gameId"], change["gameName"], change["playerCount"], change["isFull"]))
+        elif event.get("type") == "search" and event.get("result"):
+            for room in event["rooms"]:
+                self.put(shard_index, LobbyEntry(room["gameId"], room["gameName"], room["playerCount"], room["isFull"]))
+
+
+class ShardSession:
+    # one client connection, relayed to the shard that owns its game
+    __slots__ = (
+        "front", "ws", "player", "shard_index", "upstream", "pump_task",
+        "session_token", "signin_frame", "routed_frame", "is_signin_pending"
+    )
+
+    def __init__(self, front: "ShardFront", ws: WebSocketResponse) -> None:
+        self.front = front
+        self.ws = ws
+        # only used for its outbox, shard frames are relayed without decoding
+        self.player = Player(ws, "Unknown")
+        self.shard_index: Optional[int] = None
+        self.upstream: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.pump_task: Optional[asyncio.Task] = None
+        self.session_token: Optional[str] = None
+        # replayed when the client is moved to another shard
+        self.signin_frame: Optional[Union[str, bytes]] = None
+        self.routed_frame: Optional[Union[str, bytes]] = None
+        self.is_signin_pending = False
+
+    async def connect(self, shard_index: int) -> None:
+        self.shard_index = shard_index
+        self.upstream = await self.front.session.ws_connect(self.front.shard_urls[shard_index])
+        self.pump_task = asyncio.create_task(self.pump(self.upstream))
+
+    async def switch(self, shard_index: int) -> bool:
+        shard_log.info(self.player, "Moving from shard %s to shard %s.", self.shard_index, shard_index)
+        previous = self.upstream
+        try:
+            await self.connect(shard_index)
+        except aiohttp.ClientError as e:
+            shard_log.info(self.player, "Shard %s unreachable: %r. Disconnecting.", shard_index, e)
+            await self.ws.close()
+            return False
+
+        if self.session_token is not None:
+            self.front.session_shards[self.session_token] = shard_index
+        if previous is not None:
+            # the previous shard logs the player out, it was not in a room there
+            await previous.close()
+        return True
+
+    async def move(self, shard_index: int) -> None:
+        if not await self.switch(shard_index):
+            return
+
+        if self.signin_frame is not None:
+            self.is_signin_pending = True
+            await self.send_upstream(self.signin_frame)
+        if self.routed_frame is not None:
+            await self.send_upstream(self.routed_frame)
+
+    async def send_upstream(self, data: Union[str, bytes]) -> None:
+        try:
+            if isinstance(data, str):
+                await self.upstream.send_str(data)
+            else:
+                await self.upstream.send_bytes(data)
+        except (ConnectionError, RuntimeError) as e:
+            shard_log.info(self.player, "Failed to relay event: %r.", e)
+
+    async def pump(self, upstream: aiohttp.ClientWebSocketResponse) -> None:
+        async for msg in upstream:
+            if msg.type != WSMsgType.TEXT:
+                continue
+
+            frame = msg.data
+            if frame.startswith(REDIRECT_FRAME_PREFIX):
+                await self.move(codec.decode(frame)["shard"])
+                return
+            if self.is_signin_pending and frame.startswith(SIGNIN_FRAME_PREFIX):
+                # the client already saw its sign in
+                self.is_signin_pending = False
+                continue
+            self.player.enqueue(frame)
+
+        if upstream is self.upstream:
+            shard_log.info(self.player, "Shard %s closed the connection.", self.shard_index)
+            await self.ws.close()
+
+    async def handle_frame(self, data: Union[str, bytes]) -> None:
+        try:
+            event = codec.decode(data)
+        except ValueError:
+            event = None
+        event_type = event.get("type") if isinstance(event, dict) else None
+
+        if event_type == SignInClientEvent.TYPE:
+            session_token = event.get("sessionToken")
+            if type(session_token) is not str or session_token not in self.front.session_shards:
+                # shards start a session under a token they do not know, so the front knows every token it has to route,
+                # a token the front never handed out is replaced, clients never pick their own
+                session_token = new_session_token()
+                data = codec.encode({**event, "sessionToken": session_token})
+            self.front.track_session(self, session_token)
+            self.signin_frame = data
+            self.routed_frame = None
+            if type(event.get("playerName")) is str:
+                self.player.name = event["playerName"]
+
+            # a resumed session has to go back to the shard that kept the player
+            shard_index = self.front.session_shards.get(session_token)
+            if shard_index is not None and shard_index != self.shard_index:
+                if not await self.switch(shard_index):
+                    return
+            self.front.session_shards[session_token] = self.shard_index
+        elif self.signin_frame is not None and event_type in self.front.lobby_event_types:
+            # the directory has the lobby of every shard, so lobby events never reach a shard
+            await self.handle_lobby_event(event_type, event)
+            return
+        elif event_type in (JoinClientEvent.TYPE, QueueClientEvent.TYPE):
+            self.routed_frame = data
+
+        await self.send_upstream(data)
+
+    async def handle_lobby_event(self, event_type: str, event: Dict) -> None:
+        directory = self.front.directory
+        if event_type == SearchClientEvent.TYPE:
+            try:
+                search_event = search_lobby(SearchClientEvent.from_dict(event), directory.lobby)
+            except ValueError:
+                search_log.info(self.player, "Invalid search. Skipping.")
+                search_event = SearchServerEvent(False, [])
+            await self.player.send_event(search_event.to_dict())
+        elif event_type == SubscribeLobbyClientEvent.TYPE:
+            directory.lobby_feed.subscribe(self.player)
+            await self.player.send_event(SubscribeLobbyServerEvent(True, True).to_dict())
+        else:
+            directory.lobby_feed.unsubscribe(self.player)
+            await self.player.send_event(SubscribeLobbyServerEvent(True, False).to_dict())
+
+    async def close(self) -> None:
+        self.front.directory.lobby_feed.unsubscribe(self.player)
+        self.front.untrack_session(self)
+        upstream = self.upstream
+        self.upstream = None
+        if upstream is not None:
+            # the shard logs the player out and leaves its room
+            await upstream.close()
+        if self.pump_task is not None:
+            self.pump_task.cancel()
+            try:
+                await self.pump_task
+            except asyncio.CancelledError:
+                pass
+        await self.player.close()
+
+
+class ShardFront:
+    # relays clients to worker processes that each own every game with game_id % shard_count == shard index
+    def __init__(self, shard_count: int):
+        self.shard_count = shard_count
+        shard_base_port = int(os.getenv("SHARD_BASE_PORT", "9000"))
+        self.shard_ports = [shard_base_port + shard_index for shard_index in range(shard_count)]
+        self.shard_urls = [f"http://127.0.0.1:{port}/ws" for port in self.shard_ports]
+        self.shard_processes: List[multiprocessing.Process] = []
+        self.directory = LobbyDirectory(shard_count, float(os.getenv("LOBBY_FEED_WINDOW", "0.25")))
+        self.lobby_event_types = {SearchClientEvent.TYPE, SubscribeLobbyClientEvent.TYPE, UnsubscribeLobbyClientEvent.TYPE}
+        # new clients are spread over the shards, they only move when joining or queueing
+        self.home_shards = itertools.cycle(range(shard_count))
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.directory_tasks: List[asyncio.Task] = []
+        # shard of every session that is connected or may still be resumed
+        self.session_shards: Dict[str, int] = {}
+        self.active_sessions: Dict[str, ShardSession] = {}
+        self.session_grace_period = float(os.getenv("SESSION_GRACE_PERIOD", "30"))
+        self.ws_heartbeat = float(os.getenv("WS_HEARTBEAT", "30")) or None
+        Player.configure_outbox(
+            int(os.getenv("OUTBOX_HIGH_WATER", "256")),
+            int(os.getenv("OUTBOX_LOW_WATER", "64")),
+            OutboxOverflowPolicy[os.getenv("OUTBOX_OVERFLOW_POLICY", "disconnect").upper()]
+        )
+
+    def track_session(self, shard_session: ShardSession, session_token: str) -> None:
+        if shard_session.session_token is not None and shard_session.session_token != session_token:
+            self.untrack_session(shard_session)
+        shard_session.session_token = session_token
+        self.active_sessions[session_token] = shard_session
+
+    def untrack_session(self, shard_session: ShardSession) -> None:
+        session_token = shard_session.session_token
+        if session_token is None or self.active_sessions.get(session_token) is not shard_session:
+            return
+        del self.active_sessions[session_token]
+        # the shard keeps the player for the grace period, the route is kept a little longer
+        asyncio.get_running_loop().call_later(self.session_grace_period + DIRECTORY_RETRY_DELAY, self.forget_session, session_token)
+
+    def forget_session(self, session_token: str) -> None:
+        if session_token not in self.active_sessions:
+            self.session_shards.pop(session_token, None)
+
+    async def websocket_handler(self, request: Request) -> WebSocketResponse:
+        ws = WebSocketResponse(max_msg_size=MAX_EVENT_SIZE, heartbeat=self.ws_heartbeat)
+        await ws.prepare(request)
+
+        metrics.connections.inc()
+        try:
+            await self.relay_connection(ws)
+        finally:
+            metrics.connections.dec()
+        return ws
+
+    async def relay_connection(self, ws: WebSocketResponse) -> None:
+        shard_session = ShardSession(self, ws)
+        shard_session.player.start()
+        try:
+            await shard_session.connect(next(self.home_shards))
+        except aiohttp.ClientError as e:
+            front_log.info("[Shard Front]", "Shard unreachable: %r. Disconnecting.", e)
+            await shard_session.close()
+            await ws.close()
+            return
+
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT or msg.type == WSMsgType.BINARY:
+                await shard_session.handle_frame(msg.data)
+            elif msg.type == WSMsgType.ERROR:
+                event_log.info(shard_session.player, "Error in websocket: %s", ws.exception())
+
+        await shard_session.close()
+
+    async def follow_shard(self, shard_index: int) -> None:
+        while True:
+            try:
+                async with self.session.ws_connect(self.shard_urls[shard_index]) as upstream:
+                    front_log.info("[Shard Front]", "Following lobby of shard %s.", shard_index)
+                    await upstream.send_bytes(codec.encode({"type": "signin", "playerName": DIRECTORY_PLAYER_NAME}))
+                    await upstream.send_bytes(codec.encode({"type": "subscribe_lobby"}))
+                    await upstream.send_bytes(codec.encode({"type": "search", "limit": SEARCH_PAGE_MAX_LIMIT}))
+                    async for msg in upstream:
+                        if msg.type != WSMsgType.TEXT:
+                            continue
+                        event = codec.decode(msg.data)
+                        self.directory.apply(shard_index, event)
+                        if event.get("type") == "search" and event.get("nextCursor") is not None:
+                            await upstream.send_bytes(codec.encode({"type": "search", "limit": SEARCH_PAGE_MAX_LIMIT, "cursor": event["nextCursor"]}))
+            except (aiohttp.ClientError, ConnectionError) as e:
+                front_log.debug("[Shard Front]", "Shard %s unreachable: %r.", shard_index, e)
+
+            self.directory.clear_shard(shard_index)
+            await asyncio.sleep(DIRECTORY_RETRY_DELAY)
+
+    async def start_handler(self, app: web.Application) -> None:
+        self.session = aiohttp.ClientSession()
+        self.directory_tasks = [asyncio.create_task(self.follow_shard(shard_index)) for shard_index in range(self.shard_count)]
+
+    async def stop_handler(self, app: web.Application) -> None:
+        for task in self.directory_tasks:
+            task.cancel()
+        await asyncio.gather(*self.directory_tasks, return_exceptions=True)
+        await self.session.close()
+
+    async def reload_cards_handler(self, request: Request) -> Response:
+        # every shard keeps its own catalog
+        shard_results = []
+        for port in self.shard_ports:
+            async with self.session.post(
+                    f"http://127.0.0.1:{port}/admin/cards/reload",
+                    headers={"Authorization": request.headers.get("Authorization", "")},
+                    params=request.query) as response:
+                if response.status != 200:
+                    return Response(status=response.status, text=await response.text())
+                shard_results.append(await response.json())
+
+        return web.json_response({"shards": shard_results})
+
+    async def metrics_handler(self, request: Request) -> Response:
+        # one exposition for the whole server, every sample is labelled with the process it came from
+        shard_texts = await asyncio.gather(*[self.fetch_shard_metrics(port) for port in self.shard_ports])
+        texts = [('shard="front"', metrics.registry.render())]
+        texts.extend((f'shard="{shard_index}"', text) for shard_index, text in enumerate(shard_texts) if text is not None)
+        return Response(body=metrics.merge_expositions(texts).encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    async def fetch_shard_metrics(self, port: int) -> Optional[str]:
+        try:
+            async with self.session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                return await response.text()
+        except aiohttp.ClientError as e:
+            front_log.debug("[Shard Front]", "Metrics of port %s unavailable: %r.", port, e)
+            return None
+
+    async def index_handler(self, request: Request) -> FileResponse:
+        return FileResponse("./www/index.html")
+
+    def run(self, host: Optional[str] = None, port: Optional[int] = None):
+        logging.info(f"Starting {self.shard_count} shards on ports {self.shard_ports[0]}-{self.shard_ports[-1]}")
+        for shard_index, shard_port in enumerate(self.shard_ports):
+            shard_process = multiprocessing.Process(target=run_shard, args=(shard_index, self.shard_count, shard_port), daemon=True)
+            shard_process.start()
+            self.shard_processes.append(shard_process)
+
+        app = web.Application()
+        app.on_startup.append(self.start_handler)
+        app.on_cleanup.append(self.stop_handler)
+        app.add_routes([
+            web.get("/ws", self.websocket_handler),
+            web.post("/admin/cards/reload", self.reload_cards_handler),
+            web.get("/metrics", self.metrics_handler),
+            web.get("/", self.index_handler),
+            web.static("/static", "./www")
+        ])
+        try:
+            web.run_app(app, host=host, port=port)
+        finally:
+            for shard_process in self.shard_processes:
+                shard_process.terminate()
+                shard_process.join()
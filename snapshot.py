@@ -0,0 +1,55 @@
+import struct
+from typing import List, Tuple, Any
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class SnapshotWriter:
+    # little endian fields, strings and byte strings are prefixed with their length
+    __slots__ = ("parts",)
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    def pack(self, fmt: str, *values: Any) -> None:
+        self.parts.append(struct.pack("<" + fmt, *values))
+
+    def pack_bytes(self, data: bytes) -> None:
+        self.parts.append(struct.pack("<I", len(data)))
+        self.parts.append(data)
+
+    def pack_str(self, text: str) -> None:
+        self.pack_bytes(text.encode("utf-8"))
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class SnapshotReader:
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt: str) -> Tuple:
+        fmt = "<" + fmt
+        try:
+            values = struct.unpack_from(fmt, self.data, self.offset)
+        except struct.error as e:
+            raise SnapshotError(f"Truncated snapshot: {e}") from e
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def unpack_bytes(self) -> bytes:
+        size, = self.unpack("I")
+        if self.offset + size > len(self.data):
+            raise SnapshotError("Truncated snapshot")
+        data = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return data
+
+    def unpack_str(self) -> str:
+        return self.unpack_bytes().decode("utf-8")
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from log import get_logger
+
+if TYPE_CHECKING:
+    from game import Game
+
+log = get_logger("game_store", is_tagged=False)
+
+
+class GameStore:
+    # live games of this process, kept in memory only
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.games: Dict[int, "Game"] = {}
+
+    def get(self, game_id: int) -> Optional["Game"]:
+        return self.games.get(game_id)
+
+    def put(self, game: "Game") -> None:
+        self.games[game.game_id] = game
+        self.mark_dirty(game.game_id)
+
+    def restore(self, game: "Game") -> None:
+        # already stored, so not dirty
+        self.games[game.game_id] = game
+
+    def delete(self, game_id: int) -> None:
+        del self.games[game_id]
+
+    def mark_dirty(self, game_id: int) -> None:
+        pass
+
+    def load_snapshots(self, shard_index: int, shard_count: int) -> List[bytes]:
+        return []
+
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def __contains__(self, game_id: int) -> bool:
+        return game_id in self.games
+
+    def __iter__(self) -> Iterator["Game"]:
+        return iter(self.games.values())
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+
+class SqliteGameStore(GameStore):
+    # games are written behind, changed games are only snapshotted and written once per flush interval
+    name = "sqlite"
+
+    def __init__(self, path: str, flush_interval: float) -> None:
+        super().__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dirty_ids: Set[int] = set()
+        self.deleted_ids: Set[int] = set()
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        # the write of the previous flush, a write is never started before it finished
+        self.write_future: Optional[asyncio.Future] = None
+        # (dirty ids, deleted ids) of that write, taken back when it fails
+        self.write_ids: Tuple[Set[int], Set[int]] = (set(), set())
+
+        # writes happen on executor threads, one at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.connection_lock = threading.Lock()
+        with self.connection:
+            # shards share the file, every shard only writes its own games
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS games (game_id INTEGER PRIMARY KEY, snapshot BLOB NOT NULL)")
+
+    def put(self, game: "Game") -> None:
+        super().put(game)
+        self.deleted_ids.discard(game.game_id)
+
+    def delete(self, game_id: int) -> None:
+        super().delete(game_id)
+        self.dirty_ids.discard(game_id)
+        self.deleted_ids.add(game_id)
+
+    def mark_dirty(self, game_id: int) -> None:
+        if game_id in self.games:
+            self.dirty_ids.add(game_id)
+
+    def load_snapshots(self, shard_index: int, shard_count: int) -> List[bytes]:
+        with self.connection_lock:
+            rows = self.connection.execute(
+                "SELECT snapshot FROM games WHERE game_id % ? = ? ORDER BY game_id",
+                (shard_count, shard_index)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def start(self) -> None:
+        self.flush_task = asyncio.create_task(self.flush_periodically())
+
+    async def flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                log.info("[Game Store]", "Flush failed: %r", e)
+
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            if self.write_future is not None:
+                await self.wait_for_write()
+            if not self.dirty_ids and not self.deleted_ids:
+                return
+
+            # snapshots are taken on the loop so they see each game between two events, only the write is off the loop
+            rows = [(game_id, self.games[game_id].snapshot()) for game_id in self.dirty_ids]
+            deleted_ids = [(game_id,) for game_id in self.deleted_ids]
+            self.write_ids = (self.dirty_ids, self.deleted_ids)
+            self.dirty_ids = set()
+            self.deleted_ids = set()
+
+            self.write_future = asyncio.get_running_loop().run_in_executor(None, self.write, rows, deleted_ids)
+            await self.wait_for_write()
+
+    async def wait_for_write(self) -> None:
+        # a flush cancelled during the write leaves it running, the next flush waits for it
+        try:
+            await asyncio.shield(self.write_future)
+        except Exception:
+            # the next flush retries the batch, unless the games were put or deleted again since
+            written_ids, deleted_ids = self.write_ids
+            self.dirty_ids |= {game_id for game_id in written_ids if game_id in self.games and game_id not in self.deleted_ids}
+            self.deleted_ids |= {game_id for game_id in deleted_ids if game_id not in self.games}
+            raise
+        finally:
+            if self.write_future.done():
+                self.write_future = None
+                self.write_ids = (set(), set())
+
+    def write(self, rows: List[Tuple[int, bytes]], deleted_ids: List[Tuple[int]]) -> None:
+        with self.connection_lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO games (game_id, snapshot) VALUES (?, ?)", rows)
+            self.connection.executemany("DELETE FROM games WHERE game_id = ?", deleted_ids)
+
+    async def close(self) -> None:
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+        self.connection.close()
+
+
+def create_game_store(name: Optional[str] = None) -> GameStore:
+    if name is None or name == GameStore.name:
+        return GameStore()
+    if name == SqliteGameStore.name:
+        return SqliteGameStore(os.getenv("GAME_STORE_PATH", "./games.db"), float(os.getenv("GAME_STORE_FLUSH_INTERVAL", "1.0")))
+    raise ValueError(f"Unknown game store '{name}'")
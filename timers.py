@@ -0,0 +1,86 @@
+import asyncio
+import time
+from enum import Enum
+from heapq import heapify, heappush, heappop
+from typing import Awaitable, Callable, Dict, List, Tuple, TYPE_CHECKING
+
+from log import get_logger
+
+if TYPE_CHECKING:
+    from game import Game
+    from store import GameStore
+
+log = get_logger("turn_timers", is_tagged=False)
+
+
+class TurnTimers:
+    # turn and counter deadlines of every game in one heap, served by a single task
+    __slots__ = ("timeouts", "deadlines", "scheduled", "wakeup")
+
+    def __init__(self, timeouts: Dict[Enum, float]) -> None:
+        # seconds a player has in each game state, states without one have no deadline
+        self.timeouts = timeouts
+        # (deadline, game id), entries that do not match the scheduled deadline of their game are stale
+        self.deadlines: List[Tuple[float, int]] = []
+        # game id to (deadline, (game state, player turn no)), the deadline only moves when the turn does
+        self.scheduled: Dict[int, Tuple[float, Tuple[int, int]]] = {}
+        self.wakeup = asyncio.Event()
+
+    def update(self, game: "Game") -> None:
+        timeout = self.timeouts.get(game.game_state, 0)
+        if timeout <= 0:
+            self.cancel(game.game_id)
+            return
+
+        turn = (game.game_state.value, game.player_turn_no)
+        scheduled = self.scheduled.get(game.game_id)
+        if scheduled is not None and scheduled[1] == turn:
+            # events that do not move the turn on do not buy more time
+            return
+
+        deadline = time.monotonic() + timeout
+        self.scheduled[game.game_id] = (deadline, turn)
+        if not self.deadlines or deadline < self.deadlines[0][0]:
+            self.wakeup.set()
+        heappush(self.deadlines, (deadline, game.game_id))
+
+        # every turn leaves a stale entry behind, drop them once they outnumber the live ones
+        if len(self.deadlines) > 2 * len(self.scheduled) + 64:
+            self.deadlines = [(deadline, game_id) for game_id, (deadline, _) in self.scheduled.items()]
+            heapify(self.deadlines)
+
+    def cancel(self, game_id: int) -> None:
+        self.scheduled.pop(game_id, None)
+
+    def expired(self, now: float) -> List[int]:
+        expired_ids = []
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, game_id = heappop(self.deadlines)
+            scheduled = self.scheduled.get(game_id)
+            if scheduled is None or scheduled[0] != deadline:
+                continue
+            del self.scheduled[game_id]
+            expired_ids.append(game_id)
+        return expired_ids
+
+    async def run(self, games: "GameStore", on_expire: Callable[["Game"], Awaitable[None]]) -> None:
+        while True:
+            for game_id in self.expired(time.monotonic()):
+                game = games.get(game_id)
+                if game is None:
+                    continue
+                try:
+                    await on_expire(game)
+                except Exception as e:
+                    log.exception("[Turn Timers]", "Expiring turn in %s failed: %r", game, e)
+
+            # sleep until the earliest deadline, or until an earlier one is scheduled
+            self.wakeup.clear()
+            timeout = self.deadlines[0][0] - time.monotonic() if self.deadlines else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self.scheduled)
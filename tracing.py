@@ -0,0 +1,146 @@
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+import metrics
+
+# stages of one client event: decode and validate happen in the event decoder, apply is the handler without the time it
+# spent encoding or waiting for the game lock, send is timed per frame by the player writer
+
+PROFILE_MAX_SECONDS = 60.0
+
+stage_seconds = metrics.registry.register(metrics.Histogram("cyberwar_stage_seconds", "Time spent per stage of traced events", ("stage",)))
+
+
+class Trace:
+    __slots__ = ("started_at", "marked_at", "nested_seconds", "stages", "event_type", "event_action", "player_name", "game_id", "total_seconds", "is_finished")
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.marked_at = self.started_at
+        # time spent in nested stages since the last mark, not counted twice
+        self.nested_seconds = 0.0
+        self.stages: Dict[str, float] = {}
+        self.event_type: Optional[str] = None
+        self.event_action: Optional[str] = None
+        self.player_name: Optional[str] = None
+        self.game_id: Optional[int] = None
+        self.total_seconds = 0.0
+        self.is_finished = False
+
+    def mark(self, stage: str) -> None:
+        # the time since the previous mark goes to the stage
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.marked_at - self.nested_seconds
+        self.marked_at = now
+        self.nested_seconds = 0.0
+
+    def add(self, stage: str, seconds: float) -> None:
+        # a stage inside the one that is marked next
+        if self.is_finished:
+            # tasks started while handling the event keep a copy of its context
+            return
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.nested_seconds += seconds
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.event_type,
+            "action": self.event_action,
+            "player": self.player_name,
+            "gameId": self.game_id,
+            "totalMs": round(self.total_seconds * 1000, 3),
+            "stagesMs": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    # samples client events, an unsampled event costs a single attribute check
+    __slots__ = ("sample_rate", "is_enabled", "recent", "sampler")
+
+    def __init__(self, sample_rate: float = 0.0, recent_limit: int = 1000) -> None:
+        self.sample_rate = sample_rate
+        self.is_enabled = sample_rate > 0
+        self.recent: Deque[Trace] = deque(maxlen=recent_limit)
+        # not the module random, games seeded through GAME_SEED must not see trace sampling
+        self.sampler = random.Random()
+
+    def configure(self, sample_rate: float, recent_limit: int) -> None:
+        self.sample_rate = sample_rate
+        self.is_enabled = sample_rate > 0
+        self.recent = deque(self.recent, maxlen=recent_limit)
+
+    def begin(self) -> Optional[Trace]:
+        if not self.is_enabled or (self.sample_rate < 1.0 and self.sampler.random() >= self.sample_rate):
+            return None
+        trace = Trace()
+        current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: Trace, event: Any, player: Any, game_id: Optional[int]) -> None:
+        # an event that failed to decode is kept without a type
+        if event is not None:
+            trace.event_type = event.TYPE
+            trace.event_action = event.ACTION
+        if player is not None:
+            trace.player_name = player.name
+        trace.game_id = game_id
+        trace.total_seconds = time.perf_counter() - trace.started_at
+        trace.is_finished = True
+        current_trace.set(None)
+        for stage, seconds in trace.stages.items():
+            stage_seconds.observe(seconds, stage)
+        self.recent.append(trace)
+
+    def observe_send(self, seconds: float) -> None:
+        stage_seconds.observe(seconds, "send")
+
+    def slowest(self, limit: int) -> List[Trace]:
+        return sorted(self.recent, key=lambda trace: trace.total_seconds, reverse=True)[:limit]
+
+
+tracer = Tracer()
+
+
+class SamplingProfiler:
+    # samples the stack of the event loop thread from a background thread, counted as collapsed stacks
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stack_counts: Dict[str, int] = {}
+        self.sample_count = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+    def sample(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rpartition('/')[2]}:{code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.stack_counts[key] = self.stack_counts.get(key, 0) + 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        # one "frame;frame;frame count" line per stack, the format flame graph tools read
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stack_counts.items(), key=lambda item: item[1], reverse=True)]
+        return "\n".join(lines) + "\n"
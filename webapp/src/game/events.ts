@@ -11,12 +11,29 @@ export type ServerEvent = Event & {
 
 export type SignInEvent = Event & {
     type: "signin",
-    playerName: string
+    playerName: string,
+    sessionToken?: string
 }
 
 export type SignInServerEvent = ServerEvent & {
     type: "signin",
-    playerName: string
+    playerName: string,
+    sessionToken: string,
+    isResumed: boolean
+}
+
+export type ResumeServerEvent = ServerEvent & {
+    type: "resume",
+    gameId: number,
+    gameName: string,
+    host: string,
+    players: string[],
+    isCanStart: boolean,
+    gameState: string,
+    playerTurn: string | null,
+    cards: Card[],
+    scores: Record<string, Scores>,
+    discarded: Card | null
 }
 
 export type CreateEvent = Event & {
@@ -46,7 +63,12 @@ export type JoinServerEvent = ServerEvent & {
 }
 
 export type SearchEvent = Event & {
-    type: "search"
+    type: "search",
+    namePrefix?: string,
+    playerCount?: number,
+    onlyOpen?: boolean,
+    cursor?: string,
+    limit?: number
 }
 
 export type SearchServerEvent = ServerEvent & {
@@ -56,9 +78,39 @@ export type SearchServerEvent = ServerEvent & {
         gameName: string,
         playerCount: number,
         isFull: boolean,
+    }[],
+    nextCursor: string | null
+}
+
+export type SubscribeLobbyEvent = Event & {
+    type: "subscribe_lobby" | "unsubscribe_lobby"
+}
+
+export type SubscribeLobbyServerEvent = ServerEvent & {
+    type: "subscribe_lobby",
+    isSubscribed: boolean
+}
+
+export type LobbyServerEvent = ServerEvent & {
+    type: "lobby",
+    changes: {
+        change: "created" | "updated" | "removed",
+        gameId: number,
+        gameName?: string,
+        playerCount?: number,
+        isFull?: boolean,
     }[]
 }
 
+export type QueueEvent = Event & {
+    type: "queue" | "leave_queue"
+}
+
+export type QueueServerEvent = ServerEvent & {
+    type: "queue",
+    isQueued: boolean
+}
+
 export type LeaveEvent = Event & {
     type: "leave"
 }
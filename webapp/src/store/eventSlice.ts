@@ -235,16 +235,19 @@ const createEventSlice: StateCreator<AppStore, [], [], EventSlice> = (set, get)
             }))
         }
     },
-    sendSearchEvent: () => {
+    sendSearchEvent: (cursor?: string) => {
         if (!get().isWebSocketReady) {
             set((state) => ({...state, error: "Not connected to server. Try again later."}))
             return
         }
 
         const searchEvent: SearchEvent = {
-            type: "search"
+            type: "search",
+            limit: 100,
+            ...(cursor !== undefined ? {cursor} : {})
         }
 
+        set((state) => ({...state, searchCursor: cursor ?? null}))
         get().websocket?.send(JSON.stringify(searchEvent))
     },
     handleSearchServerEvent: (searchServerEvent) => {
@@ -255,10 +258,15 @@ const createEventSlice: StateCreator<AppStore, [], [], EventSlice> = (set, get)
             }))
         }
 
+        // the first page replaces the lobby, later pages are added to it until there is no next cursor
         set((state) => ({
             ...state,
-            lobby: searchServerEvent.rooms
+            lobby: state.searchCursor === null ? searchServerEvent.rooms : [...state.lobby, ...searchServerEvent.rooms]
         }))
+
+        if (searchServerEvent.result && searchServerEvent.nextCursor) {
+            get().sendSearchEvent(searchServerEvent.nextCursor)
+        }
     },
     sendStartEvent: () => {
         if (!get().isWebSocketReady) {
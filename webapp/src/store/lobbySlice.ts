@@ -2,7 +2,8 @@ import {StateCreator} from "zustand"
 import {AppStore, LobbySlice} from "./store"
 
 const createLobbySlice: StateCreator<AppStore, [], [], LobbySlice> = () => ({
-    lobby: []
+    lobby: [],
+    searchCursor: null
 })
 
 export default createLobbySlice
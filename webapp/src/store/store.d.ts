@@ -37,7 +37,9 @@ export type GameSlice = {
 }
 
 export type LobbySlice = {
-    lobby: Room[]
+    lobby: Room[],
+    // cursor of the search page being fetched, null for the first page
+    searchCursor: string | null
 }
 
 export type EventSlice = {
@@ -56,7 +58,7 @@ export type EventSlice = {
     sendLeaveEvent: () => void,
 
     handleLeaveServerEvent: (leaveServerEvent: LeaveServerEvent) => void,
-    sendSearchEvent: () => void,
+    sendSearchEvent: (cursor?: string) => void,
 
     handleSearchServerEvent: (searchServerEvent: SearchServerEvent) => void,
     sendStartEvent: () => void,